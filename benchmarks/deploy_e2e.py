@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+try:
+    from urllib2 import Request, urlopen
+except ImportError:
+    from urllib.request import Request, urlopen
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+FAKE_DROPBOX_SCRIPT = os.path.join(BENCHMARK_DIR, "fake_dropbox.py")
+REPORT_MARKER = "--deploy-e2e-report--"
+STORAGE_PATH = "/Deployment"
+APP_NAME = "Bench"
+PAYLOAD_BLOCK_SIZE = 1024 * 1024
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+from fake_dropbox import parse_size
+
+SIZES = ["1MB", "16MB", "64MB"]
+DEPTHS = [0, 100, 1000]
+PROFILES = {
+    "lan": {"latency": 0.0, "bandwidth": None, "error_rate": 0.0},
+    "wan": {"latency": 0.05, "bandwidth": "10MB", "error_rate": 0.0},
+    "flaky": {"latency": 0.01, "bandwidth": None, "error_rate": 0.05}
+}
+
+
+def call_server(url, path, body=None):
+    request = Request(url + path)
+    if body is not None:
+        request.add_header("Content-Type", "application/json")
+        request.data = json.dumps(body).encode("utf-8")
+    response = urlopen(request)
+    try:
+        return json.loads(response.read().decode("utf-8"))
+    finally:
+        response.close()
+
+
+def start_server(profile, seed):
+    args = [
+        sys.executable, FAKE_DROPBOX_SCRIPT,
+        "--latency", str(profile["latency"]),
+        "--error-rate", str(profile["error_rate"]),
+        "--seed", str(seed)
+    ]
+    if profile["bandwidth"]:
+        args += ["--bandwidth", profile["bandwidth"]]
+    process = subprocess.Popen(args, stdout=subprocess.PIPE)
+    url = process.stdout.readline().decode("utf-8").strip()
+    if not url:
+        process.wait()
+        raise RuntimeError("Fake Dropbox server failed to start")
+    return process, url
+
+
+def stop_server(process):
+    process.terminate()
+    process.wait()
+
+
+def make_ipa(path, size):
+    import biplist
+    ipa_file = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED)
+    try:
+        ipa_file.writestr(
+            "Payload/%s.app/Info.plist" % (APP_NAME),
+            biplist.writePlistToString({
+                "CFBundleName": APP_NAME,
+                "CFBundleIdentifier": "com.example.bench",
+                "CFBundleVersion": "1",
+                "CFBundleShortVersionString": "1.0",
+                "MinimumOSVersion": "9.0",
+                "UIDeviceFamily": [1]
+            }, False)
+        )
+        payload_path = path + ".payload"
+        payload = open(payload_path, "wb")
+        try:
+            remaining = size
+            while remaining > 0:
+                block = os.urandom(min(PAYLOAD_BLOCK_SIZE, remaining))
+                payload.write(block)
+                remaining -= len(block)
+        finally:
+            payload.close()
+        ipa_file.write(payload_path, "Payload/%s.app/%s" % (APP_NAME, APP_NAME))
+        os.remove(payload_path)
+    finally:
+        ipa_file.close()
+
+
+def seed_history(client, url, depth):
+    import biplist
+    import deploy
+    app_url = "/Public%s/%s" % (STORAGE_PATH, APP_NAME)
+    started = int(time.time()) - depth * 60
+    builds = []
+    files = {}
+    for index in range(depth):
+        path = "1.0-%d-%d" % (index + 1, started + index * 60)
+        files["%s/%s/manifest.plist" % (app_url, path)] = "<plist/>"
+        builds.insert(0, {
+            "path": path,
+            "bundle_version": str(index + 1),
+            "bundle_version_short": "1.0",
+            "modified": time.strftime(
+                "%d/%m/%Y %H:%M:%S", time.localtime(started + index * 60)
+            )
+        })
+    call_server(url, "/__seed", {"folders": [app_url], "files": files})
+    if builds:
+        deploy.archive_builds(builds, deploy.INDEX_PAGE_SIZE)
+        client.put_file(
+            "%s/builds.plist" % (app_url),
+            biplist.writePlistToString({
+                "builds": builds,
+                "pages": {
+                    "format": deploy.INDEX_PAGE_FORMAT,
+                    "size": deploy.INDEX_PAGE_SIZE
+                }
+            })
+        )
+
+
+def get_peak_memory():
+    import resource
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak_memory
+    return peak_memory * 1024
+
+
+def run_scenario(scenario):
+    try:
+        from StringIO import StringIO
+    except ImportError:
+        from io import StringIO
+    import deploy
+    from dropbox import DropboxClient, DropboxConnection, DropboxUtil
+
+    scheme, host = str(scenario["url"]).split("://", 1)
+    DropboxUtil.API_SCHEME = scheme
+    DropboxUtil.API_HOST = host
+    DropboxUtil.API_CONTENT_HOST = host
+    pool_size = max(DropboxConnection.POOL_SIZES.values())
+    DropboxConnection.POOL_SIZES = {
+        host: pool_size,
+        host.split(":")[0]: pool_size
+    }
+
+    client = DropboxClient("benchmark", ROOT_DIR)
+    seed_history(client, scenario["url"], scenario["depth"])
+    before = call_server(scenario["url"], "/__stats")
+
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    started = time.time()
+    try:
+        ipa_analysis = deploy.analyse_ipa(scenario["ipa_file"])
+        analysed = time.time()
+        deploy.deploy(client, {
+            "setup_mode": False,
+            "storage_path": STORAGE_PATH,
+            "ipa_file": scenario["ipa_file"],
+            "ipa_file_name": os.path.basename(scenario["ipa_file"]),
+            "ipa_info": ipa_analysis["info"],
+            "ipa_analysis": ipa_analysis,
+            "pipeline": scenario["pipeline"]
+        })
+        finished = time.time()
+    finally:
+        sys.stdout = stdout
+
+    after = call_server(scenario["url"], "/__stats")
+    report = {
+        "wall": finished - started,
+        "analysis": analysed - started,
+        "deploy": finished - analysed,
+        "requests": after["requests"] - before["requests"],
+        "bytes_up": after["bytes_in"] - before["bytes_in"],
+        "bytes_down": after["bytes_out"] - before["bytes_out"],
+        "injected_errors": after["errors"] - before["errors"],
+        "endpoints": dict(
+            (endpoint, count - before["endpoints"].get(endpoint, 0))
+            for endpoint, count in after["endpoints"].items()
+            if count != before["endpoints"].get(endpoint, 0)
+        ),
+        "connections": client.connection.get_stats()["opened"],
+        "retries": client.connection.get_retry_stats()["retries"],
+        "peak_memory": get_peak_memory()
+    }
+    client.connection.close()
+    sys.stderr.write(REPORT_MARKER + json.dumps(report) + "\n")
+
+
+def run_child(scenario):
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--scenario", json.dumps(scenario)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    _, error = process.communicate()
+    error = error.decode("utf-8", "replace")
+    if REPORT_MARKER not in error:
+        raise RuntimeError(error)
+    return json.loads(error.split(REPORT_MARKER)[-1])
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return "%.1f%s" % (size, unit)
+        size /= 1024.0
+    return "%.1fGB" % (size)
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        description="End-to-end deploy benchmark against a local fake Dropbox"
+    )
+    parser.add_argument("--sizes", default=",".join(SIZES))
+    parser.add_argument("--depths", default=",".join(map(str, DEPTHS)))
+    parser.add_argument("--profiles", default=",".join(sorted(PROFILES)))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--json", default=None, help="Write raw results here")
+    parser.add_argument("--scenario", default=None, help=argparse.SUPPRESS)
+    return parser
+
+
+def run():
+    args = create_parser().parse_args()
+    if args.scenario:
+        return run_scenario(json.loads(args.scenario))
+
+    sizes = args.sizes.split(",")
+    depths = [int(depth) for depth in args.depths.split(",")]
+    work_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        ipa_files = {}
+        for size in sizes:
+            ipa_files[size] = os.path.join(work_dir, "%s-%s.ipa" % (APP_NAME, size))
+            make_ipa(ipa_files[size], parse_size(size))
+
+        print("%-6s %6s %6s %9s %9s %8s %9s %9s %5s %7s %9s" % (
+            "net", "size", "depth", "wall (s)", "best (s)", "requests",
+            "up", "down", "conns", "retries", "peak rss"
+        ))
+        for profile_name in args.profiles.split(","):
+            process, url = start_server(PROFILES[profile_name], args.seed)
+            try:
+                for size in sizes:
+                    for depth in depths:
+                        reports = []
+                        for _ in range(args.repeat):
+                            call_server(url, "/__reset", {})
+                            reports.append(run_child({
+                                "url": url,
+                                "ipa_file": ipa_files[size],
+                                "depth": depth,
+                                "pipeline": args.pipeline
+                            }))
+                        walls = sorted(report["wall"] for report in reports)
+                        report = reports[-1]
+                        print("%-6s %6s %6d %9.3f %9.3f %8d %9s %9s %5d %7d %9s" % (
+                            profile_name, size, depth,
+                            walls[len(walls) // 2], walls[0],
+                            report["requests"],
+                            format_size(report["bytes_up"]),
+                            format_size(report["bytes_down"]),
+                            report["connections"], report["retries"],
+                            format_size(max(
+                                item["peak_memory"] for item in reports
+                            ))
+                        ))
+                        sys.stdout.flush()
+                        results.append({
+                            "profile": profile_name,
+                            "size": size,
+                            "depth": depth,
+                            "reports": reports
+                        })
+            finally:
+                stop_server(process)
+    finally:
+        shutil.rmtree(work_dir)
+
+    if args.json:
+        result_file = open(args.json, "w")
+        try:
+            json.dump(results, result_file, indent=2)
+        finally:
+            result_file.close()
+
+
+if __name__ == "__main__":
+    run()
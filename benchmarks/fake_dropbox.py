@@ -0,0 +1,550 @@
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import re
+import ssl
+import sys
+import threading
+import time
+import uuid
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+CONTENT_HASH_BLOCK_SIZE = 4 * 1024 * 1024
+READ_BLOCK_SIZE = 64 * 1024
+LIST_FOLDER_LIMIT = 2000
+SIZE_PATTERN = re.compile("^([\\d.]+)\\s*([kKmMgG]?)[bB]?$")
+SIZE_UNITS = {
+    "": 1,
+    "k": 1000,
+    "m": 1000 ** 2,
+    "g": 1000 ** 3
+}
+
+
+def parse_size(value):
+    match = SIZE_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError("Invalid size: %s" % (value))
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def get_content_hash(data):
+    digests = b"".join([
+        hashlib.sha256(data[offset:offset + CONTENT_HASH_BLOCK_SIZE]).digest()
+        for offset in range(0, len(data), CONTENT_HASH_BLOCK_SIZE)
+    ])
+    return hashlib.sha256(digests).hexdigest()
+
+
+def timestamp():
+    return datetime.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeDropboxError(Exception):
+    def __init__(self, summary, error, status=409):
+        Exception.__init__(self, summary)
+        self.status = status
+        self.body = {
+            "error_summary": summary,
+            "error": error
+        }
+
+
+class FakeDropboxStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+        self.folders = {"": ""}
+        self.sessions = {}
+        self.cursors = {}
+        self.jobs = {}
+
+    @staticmethod
+    def normalize(path):
+        path = (path or "").replace("\\", "/").strip("/")
+        return "/" + path if path else ""
+
+    @staticmethod
+    def not_found(path):
+        return FakeDropboxError("path/not_found/", {
+            ".tag": "path",
+            "path": {".tag": "not_found"}
+        })
+
+    def add_folder(self, path):
+        path = FakeDropboxStore.normalize(path)
+        while path and path.lower() not in self.folders:
+            self.folders[path.lower()] = path
+            path = path.rsplit("/", 1)[0]
+
+    def put(self, path, data):
+        path = FakeDropboxStore.normalize(path)
+        with self.lock:
+            self.add_folder(path.rsplit("/", 1)[0])
+            self.files[path.lower()] = {
+                "path_display": path,
+                "data": data,
+                "server_modified": timestamp(),
+                "content_hash": get_content_hash(data),
+                "rev": uuid.uuid4().hex[:9]
+            }
+            return self.get_file_metadata(path.lower())
+
+    def get_file_metadata(self, key):
+        entry = self.files[key]
+        return {
+            ".tag": "file",
+            "name": entry["path_display"].rsplit("/", 1)[-1],
+            "path_lower": key,
+            "path_display": entry["path_display"],
+            "id": "id:" + key,
+            "size": len(entry["data"]),
+            "server_modified": entry["server_modified"],
+            "client_modified": entry["server_modified"],
+            "rev": entry["rev"],
+            "content_hash": entry["content_hash"]
+        }
+
+    def get_folder_metadata(self, key):
+        path = self.folders[key]
+        return {
+            ".tag": "folder",
+            "name": path.rsplit("/", 1)[-1],
+            "path_lower": key,
+            "path_display": path,
+            "id": "id:" + key
+        }
+
+    def get_metadata(self, path):
+        key = FakeDropboxStore.normalize(path).lower()
+        with self.lock:
+            if key in self.files:
+                return self.get_file_metadata(key)
+            if key and key in self.folders:
+                return self.get_folder_metadata(key)
+        raise FakeDropboxStore.not_found(path)
+
+    def get_file(self, path):
+        key = FakeDropboxStore.normalize(path).lower()
+        with self.lock:
+            if key not in self.files:
+                raise FakeDropboxStore.not_found(path)
+            return self.get_file_metadata(key), self.files[key]["data"]
+
+    def list_folder(self, path, recursive=False, limit=None):
+        key = FakeDropboxStore.normalize(path).lower()
+        with self.lock:
+            if key not in self.folders:
+                raise FakeDropboxStore.not_found(path)
+            entries = []
+            for keys, get_metadata in (
+                (self.folders, self.get_folder_metadata),
+                (self.files, self.get_file_metadata)
+            ):
+                for entry_key in keys:
+                    if not entry_key.startswith(key + "/"):
+                        continue
+                    if not recursive and "/" in entry_key[len(key) + 1:]:
+                        continue
+                    entries.append(get_metadata(entry_key))
+        entries.sort(key=lambda entry: entry["path_lower"])
+        return self.create_page(entries, limit)
+
+    def list_folder_continue(self, cursor):
+        with self.lock:
+            if cursor not in self.cursors:
+                raise FakeDropboxError("reset/", {".tag": "reset"})
+            entries, limit = self.cursors.pop(cursor)
+        return self.create_page(entries, limit)
+
+    def create_page(self, entries, limit):
+        limit = min(limit or LIST_FOLDER_LIMIT, LIST_FOLDER_LIMIT)
+        cursor = uuid.uuid4().hex
+        has_more = len(entries) > limit
+        if has_more:
+            with self.lock:
+                self.cursors[cursor] = (entries[limit:], limit)
+        return {
+            "entries": entries[:limit],
+            "cursor": cursor,
+            "has_more": has_more
+        }
+
+    def copy(self, from_path, to_path):
+        from_key = FakeDropboxStore.normalize(from_path).lower()
+        to_path = FakeDropboxStore.normalize(to_path)
+        with self.lock:
+            if to_path.lower() in self.files or to_path.lower() in self.folders:
+                raise FakeDropboxError("to/conflict/file/", {
+                    ".tag": "to",
+                    "to": {".tag": "conflict"}
+                })
+            if from_key not in self.files:
+                raise FakeDropboxError("from_lookup/not_found/", {
+                    ".tag": "from_lookup",
+                    "from_lookup": {".tag": "not_found"}
+                })
+            data = self.files[from_key]["data"]
+        return {"metadata": self.put(to_path, data)}
+
+    def delete(self, path):
+        key = FakeDropboxStore.normalize(path).lower()
+        with self.lock:
+            if key in self.files:
+                metadata = self.get_file_metadata(key)
+                del self.files[key]
+            elif key and key in self.folders:
+                metadata = self.get_folder_metadata(key)
+                for keys in (self.files, self.folders):
+                    for entry_key in list(keys):
+                        if entry_key == key or entry_key.startswith(key + "/"):
+                            del keys[entry_key]
+            else:
+                return {
+                    ".tag": "failure",
+                    "failure": {
+                        ".tag": "path_lookup",
+                        "path_lookup": {".tag": "not_found"}
+                    }
+                }
+        return {".tag": "success", "metadata": metadata}
+
+    def delete_batch(self, paths, polls=1):
+        entries = [self.delete(path) for path in paths]
+        async_job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[async_job_id] = [polls, entries]
+        return {".tag": "async_job_id", "async_job_id": async_job_id}
+
+    def check_job(self, async_job_id):
+        with self.lock:
+            job = self.jobs.get(async_job_id)
+            if job is None:
+                raise FakeDropboxError("invalid_async_job_id/", {
+                    ".tag": "invalid_async_job_id"
+                })
+            if job[0] > 0:
+                job[0] -= 1
+                return {".tag": "in_progress"}
+            del self.jobs[async_job_id]
+        return {".tag": "complete", "entries": job[1]}
+
+    def start_session(self, data, concurrent):
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = {
+                "concurrent": concurrent,
+                "chunks": {} if concurrent else None,
+                "data": [] if concurrent else [data],
+                "offset": 0 if concurrent else len(data)
+            }
+        return {"session_id": session_id}
+
+    def append_session(self, cursor, data):
+        with self.lock:
+            session = self.sessions.get(cursor.get("session_id"))
+            if session is None:
+                raise FakeDropboxError("not_found/", {".tag": "not_found"})
+            if session["concurrent"]:
+                session["chunks"][cursor["offset"]] = data
+                return
+            if cursor["offset"] != session["offset"]:
+                raise FakeDropboxError("incorrect_offset/", {
+                    ".tag": "incorrect_offset",
+                    "correct_offset": session["offset"]
+                })
+            session["data"].append(data)
+            session["offset"] += len(data)
+
+    def finish_session(self, cursor, commit, data):
+        if data:
+            self.append_session(cursor, data)
+        with self.lock:
+            session = self.sessions.pop(cursor.get("session_id"), None)
+        if session is None:
+            raise FakeDropboxError("lookup_failed/not_found/", {
+                ".tag": "lookup_failed",
+                "lookup_failed": {".tag": "not_found"}
+            })
+        if session["concurrent"]:
+            chunks = [
+                session["chunks"][offset]
+                for offset in sorted(session["chunks"])
+            ]
+        else:
+            chunks = session["data"]
+        return self.put(commit["path"], b"".join(chunks))
+
+    def seed(self, folders, files):
+        with self.lock:
+            for path in folders:
+                self.add_folder(path)
+        for path, content in files.items():
+            self.put(path, content.encode("utf-8"))
+
+
+class FakeDropboxHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    CONTROL_PATHS = ("/__stats", "/__reset", "/__seed")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        started = time.time()
+        chunks = []
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(READ_BLOCK_SIZE, remaining))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            self.server.throttle(length - remaining, started)
+        self.server.add_bytes("bytes_in", length - remaining)
+        return b"".join(chunks)
+
+    def send_body(self, status, body, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        started = time.time()
+        for offset in range(0, len(body), READ_BLOCK_SIZE):
+            self.wfile.write(body[offset:offset + READ_BLOCK_SIZE])
+            self.server.throttle(offset + READ_BLOCK_SIZE, started)
+        self.server.add_bytes("bytes_out", len(body))
+
+    def send_json(self, status, result, headers=None):
+        headers = dict(headers or {})
+        headers["Content-Type"] = "application/json"
+        self.send_body(status, json.dumps(result).encode("utf-8"), headers)
+
+    def get_target(self):
+        path = self.path.split("?", 1)[0]
+        if path.startswith("/2/"):
+            path = path[2:]
+        return path
+
+    def do_GET(self):
+        if self.get_target() == "/__stats":
+            self.send_json(200, self.server.get_stats())
+        else:
+            self.send_json(404, {"error_summary": "not_found/"})
+
+    def do_POST(self):
+        target = self.get_target()
+        body = self.read_body()
+        if target in FakeDropboxHandler.CONTROL_PATHS:
+            return self.handle_control(target, body)
+        self.server.add_request(target)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        injected_error = self.server.get_injected_error()
+        if injected_error:
+            self.server.add_bytes("errors", 1)
+            return self.send_json(injected_error, {
+                "error_summary": "injected_error/",
+                "error": {"retry_after": self.server.retry_after}
+            })
+        api_arg = self.headers.get("Dropbox-API-Arg")
+        try:
+            arg = json.loads(api_arg or body.decode("utf-8") or "{}")
+            self.handle_api(target, arg, body if api_arg else b"")
+        except FakeDropboxError as e:
+            self.send_json(e.status, e.body)
+        except (ValueError, KeyError) as e:
+            self.send_json(400, {"error_summary": "bad_request/%s" % (e)})
+
+    def handle_control(self, target, body):
+        if target == "/__reset":
+            self.server.reset()
+        elif target == "/__seed":
+            seed = json.loads(body.decode("utf-8"))
+            self.server.store.seed(
+                seed.get("folders") or [], seed.get("files") or {}
+            )
+        self.send_json(200, self.server.get_stats())
+
+    def handle_api(self, target, arg, data):
+        store = self.server.store
+        if target == "/users/get_current_account":
+            result = {
+                "account_id": self.server.account_id,
+                "email": "fake@example.com",
+                "name": {"display_name": "Fake Dropbox"}
+            }
+        elif target == "/files/get_metadata":
+            result = store.get_metadata(arg["path"])
+        elif target == "/files/list_folder":
+            result = store.list_folder(
+                arg["path"], arg.get("recursive", False), arg.get("limit")
+            )
+        elif target == "/files/list_folder/continue":
+            result = store.list_folder_continue(arg["cursor"])
+        elif target == "/files/upload":
+            result = store.put(arg["path"], data)
+        elif target == "/files/upload_session/start":
+            result = store.start_session(
+                data, arg.get("session_type") == "concurrent"
+            )
+        elif target == "/files/upload_session/append_v2":
+            store.append_session(arg["cursor"], data)
+            result = None
+        elif target == "/files/upload_session/finish":
+            result = store.finish_session(arg["cursor"], arg["commit"], data)
+        elif target == "/files/delete_batch":
+            result = store.delete_batch(
+                [entry["path"] for entry in arg["entries"]]
+            )
+        elif target == "/files/delete_batch/check":
+            result = store.check_job(arg["async_job_id"])
+        elif target == "/files/copy_v2":
+            result = store.copy(arg["from_path"], arg["to_path"])
+        elif target == "/files/download":
+            metadata, content = store.get_file(arg["path"])
+            return self.send_body(200, content, {
+                "Content-Type": "application/octet-stream",
+                "Dropbox-API-Result": json.dumps(metadata)
+            })
+        else:
+            return self.send_json(404, {"error_summary": "unknown_endpoint/"})
+        self.send_json(200, result)
+
+
+class FakeDropboxServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, bandwidth=None, error_rate=0.0, error_statuses=(429, 503), retry_after=0, seed=None, certfile=None, keyfile=None, verbose=False):
+        HTTPServer.__init__(self, address, FakeDropboxHandler)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.verbose = verbose
+        self.account_id = "dbid:fake"
+        self.stats_lock = threading.Lock()
+        self.scheme = "http"
+        if certfile:
+            context = ssl.SSLContext(
+                getattr(ssl, "PROTOCOL_TLS_SERVER", ssl.PROTOCOL_SSLv23)
+            )
+            context.load_cert_chain(certfile, keyfile)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+            self.scheme = "https"
+        self.reset()
+
+    def reset(self):
+        with self.stats_lock:
+            self.store = FakeDropboxStore()
+            self.stats = {
+                "requests": 0,
+                "endpoints": {},
+                "bytes_in": 0,
+                "bytes_out": 0,
+                "errors": 0
+            }
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+            stats["endpoints"] = dict(self.stats["endpoints"])
+            return stats
+
+    def add_request(self, target):
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["endpoints"][target] = (
+                self.stats["endpoints"].get(target, 0) + 1
+            )
+
+    def add_bytes(self, key, count):
+        with self.stats_lock:
+            self.stats[key] += count
+
+    def get_injected_error(self):
+        if not self.error_rate:
+            return None
+        with self.stats_lock:
+            if self.random.random() >= self.error_rate:
+                return None
+            return self.random.choice(self.error_statuses)
+
+    def throttle(self, transferred, started):
+        if not self.bandwidth:
+            return
+        delay = transferred / float(self.bandwidth) - (time.time() - started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_url(self):
+        return "%s://%s:%d" % (
+            self.scheme, self.server_address[0], self.server_address[1]
+        )
+
+
+def create_server(args):
+    return FakeDropboxServer(
+        (args.host, args.port),
+        latency=args.latency,
+        bandwidth=parse_size(args.bandwidth) if args.bandwidth else None,
+        error_rate=args.error_rate,
+        error_statuses=tuple(
+            int(status) for status in args.error_statuses.split(",")
+        ),
+        retry_after=args.retry_after,
+        seed=args.seed,
+        certfile=args.cert,
+        keyfile=args.key,
+        verbose=args.verbose
+    )
+
+
+def create_parser():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the Dropbox API used by iOSDeploy"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every API request")
+    parser.add_argument("--bandwidth", default=None,
+                        help="Transfer cap per request, e.g. 10MB")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Probability of an injected error response")
+    parser.add_argument("--error-statuses", default="429,503")
+    parser.add_argument("--retry-after", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--cert", default=None, help="Serve HTTPS with this certificate")
+    parser.add_argument("--key", default=None)
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def run():
+    server = create_server(create_parser().parse_args())
+    print(server.get_url())
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,87 @@
+import fnmatch
+import os
+import plistlib
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deploy_ipa import *
+
+ENTRY_COUNTS = [100, 1000, 10000, 50000]
+REPEAT = 5
+
+
+def create_ipa(path, entry_count):
+    info = {
+        "CFBundleName": "Benchmark",
+        "CFBundleVersion": "1",
+        "CFBundleShortVersionString": "1.0"
+    }
+    if hasattr(plistlib, "dumps"):
+        info_plist = plistlib.dumps(info)
+    else:
+        info_plist = plistlib.writePlistToString(info)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as ipa:
+        for index in range(entry_count):
+            if index == entry_count // 2:
+                ipa.writestr("Payload/Benchmark.app/Info.plist", info_plist)
+                ipa.writestr(
+                    "Payload/Benchmark.app/embedded.mobileprovision", "x"
+                )
+            ipa.writestr(
+                "Payload/Benchmark.app/Assets/%d/asset.png" % (index), "x"
+            )
+
+
+def analyse_with_namelist(ipa_file):
+    with zipfile.ZipFile(ipa_file, "r") as ipa:
+        files = ipa.namelist()
+        info_plist = fnmatch.filter(files, "Payload/*.app/Info.plist")[0]
+        provision = fnmatch.filter(
+            files, "Payload/*.app/embedded.mobileprovision"
+        )[0]
+        return ipa.read(info_plist), ipa.read(provision)
+
+
+def analyse_with_inspector(ipa_file):
+    return IPAInspector(ipa_file).inspect()
+
+
+def measure(function, ipa_file):
+    best = None
+    for _ in range(REPEAT):
+        started = time.time()
+        function(ipa_file)
+        elapsed = time.time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def run():
+    work_dir = tempfile.mkdtemp()
+    try:
+        print("%10s %14s %14s %8s" % (
+            "entries", "namelist (ms)", "inspector (ms)", "speedup"
+        ))
+        for entry_count in ENTRY_COUNTS:
+            ipa_file = os.path.join(work_dir, "%d.ipa" % (entry_count))
+            create_ipa(ipa_file, entry_count)
+            namelist_time = measure(analyse_with_namelist, ipa_file)
+            inspector_time = measure(analyse_with_inspector, ipa_file)
+            print("%10d %14.2f %14.2f %7.1fx" % (
+                entry_count,
+                namelist_time * 1000,
+                inspector_time * 1000,
+                namelist_time / max(inspector_time, 1e-9)
+            ))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    run()
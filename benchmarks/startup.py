@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPLOY_SCRIPT = os.path.join(ROOT_DIR, "deploy.py")
+REPEAT = 5
+TOP_IMPORTS = 3
+REPORT_MARKER = "--startup-report--"
+
+COMMANDS = [
+    ("--help", ["--help"], False),
+    ("--clear", ["--clear"], True),
+    ("no setup", [], False)
+]
+
+CHILD_SOURCE = """
+import json
+import sys
+import time
+try:
+    import builtins
+except ImportError:
+    import __builtin__ as builtins
+
+started = time.time()
+original_import = builtins.__import__
+stack = []
+timings = {}
+
+
+def timed_import(name, *args, **kwargs):
+    if name in sys.modules:
+        return original_import(name, *args, **kwargs)
+    import_started = time.time()
+    stack.append(0.0)
+    try:
+        return original_import(name, *args, **kwargs)
+    finally:
+        elapsed = time.time() - import_started
+        children = stack.pop()
+        if stack:
+            stack[-1] += elapsed
+        timings[name] = timings.get(name, 0.0) + elapsed - children
+
+
+builtins.__import__ = timed_import
+sys.argv = sys.argv[1:]
+sys.path.insert(0, %(root)r)
+script_file = open(sys.argv[0])
+script = compile(script_file.read(), sys.argv[0], "exec")
+script_file.close()
+try:
+    exec(script, {"__name__": "__main__", "__file__": sys.argv[0]})
+except SystemExit:
+    pass
+finally:
+    builtins.__import__ = original_import
+sys.stderr.write(%(marker)r + json.dumps({
+    "elapsed": time.time() - started,
+    "modules": len(sys.modules),
+    "imports": sorted(timings.items(), key=lambda item: -item[1])[:%(top)d]
+}) + "\\n")
+"""
+
+
+def run_command(args, work_dir, with_config):
+    if with_config:
+        config = open(os.path.join(work_dir, ".iosdeploy"), "w")
+        config.write("ACCESS_TOKEN=benchmark\n")
+        config.close()
+    source = CHILD_SOURCE % {
+        "root": ROOT_DIR,
+        "marker": REPORT_MARKER,
+        "top": TOP_IMPORTS
+    }
+    started = time.time()
+    process = subprocess.Popen(
+        [sys.executable, "-c", source, DEPLOY_SCRIPT] + args,
+        cwd=work_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    _, error = process.communicate()
+    elapsed = time.time() - started
+    error = error.decode("utf-8", "replace")
+    if REPORT_MARKER not in error:
+        raise RuntimeError(error)
+    report = json.loads(error.split(REPORT_MARKER)[-1])
+    report["wall"] = elapsed
+    return report
+
+
+def measure(args, work_dir, with_config):
+    best = None
+    for _ in range(REPEAT):
+        report = run_command(args, work_dir, with_config)
+        if best is None or report["wall"] < best["wall"]:
+            best = report
+    return best
+
+
+def run():
+    work_dir = tempfile.mkdtemp()
+    try:
+        print("%-16s %10s %12s %8s  %s" % (
+            "command", "wall (ms)", "script (ms)", "modules", "slowest imports"
+        ))
+        for name, args, with_config in COMMANDS:
+            report = measure(args, work_dir, with_config)
+            print("%-16s %10.1f %12.1f %8d  %s" % (
+                name,
+                report["wall"] * 1000,
+                report["elapsed"] * 1000,
+                report["modules"],
+                ", ".join([
+                    "%s %.1fms" % (module, elapsed * 1000)
+                    for module, elapsed in report["imports"]
+                ])
+            ))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    run()
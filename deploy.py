@@ -1,21 +1,25 @@
 import os
 import sys
 import re
-import zipfile
 import fnmatch
-import biplist
-import datetime
 import time
-import json
-from dropbox import *
 
 CONFIG_OPTION_PATTERN = re.compile("(\\w+)(=(.*))")
-MACRO_PATTERN = re.compile("<!--\\s*\\[(\\w+)]\\s*-->")
 
 EXEC_DIR = os.path.dirname(os.path.abspath(__file__))
 WORKING_DIR = os.getcwd()
 
 DUMP_JSON = False
+PROGRESS = None
+LIST_FOLDER_PAGE_SIZE = 500
+BUILD_INDEX_FILE_NAME = "builds.plist"
+CACHE_FILE_NAME = ".iosdeploy-cache"
+BATCH_CONCURRENCY = 4
+INDEX_PAGE_SIZE = 25
+INDEX_PAGE_FILE_NAME = "page-%d.html"
+INDEX_PAGE_FEED_FILE_NAME = "page-%d.json"
+INDEX_PAGE_FORMAT = 3
+BUILD_FEED_FILE_NAME = "builds.json"
 
 
 def to_readable_size(filesize):
@@ -41,6 +45,99 @@ def validate_path(client, path):
         return None
 
 
+def is_binary_path_valid(path):
+    return bool(path) and (
+        not os.path.exists(path) or os.path.isdir(path)
+    )
+
+
+def find_and_analyse_ipa(path):
+    ipa_file = get_ipa_file(path)
+    if not ipa_file:
+        return None, None
+    return ipa_file, analyse_ipa(ipa_file)
+
+
+def timed_call(function, *args):
+    started = time.time()
+    try:
+        return function(*args), None, time.time() - started
+    except Exception as e:
+        return None, e, time.time() - started
+
+
+def trace(name, category="deploy", **args):
+    from dropbox import DropboxTracer
+    return DropboxTracer.trace(name, category, **args)
+
+
+def get_trace_result():
+    from dropbox import DropboxTracer
+    if DropboxTracer.active is None:
+        return None
+    return DropboxTracer.active.get_result()
+
+
+def finish_trace():
+    if "dropbox" not in sys.modules:
+        return
+    from dropbox import DropboxTracer
+    tracer = DropboxTracer.stop()
+    if tracer and tracer.path:
+        tracer.save_chrome_trace(tracer.path)
+
+
+def preflight(client, storage_path=None, binary_path=None, cache=None):
+    results = {}
+    timings = {}
+    tasks = {}
+    account_info = cache.get_account_info() if cache else None
+    if account_info:
+        results["account_info"] = (account_info, None)
+    else:
+        tasks["account_info"] = (client.account_info, ())
+    if storage_path is not None:
+        is_folder = cache.get_folder(storage_path) if cache else None
+        if is_folder is not None:
+            results["storage_path"] = (is_folder, None)
+        else:
+            tasks["storage_path"] = (validate_path, (
+                client, "/Public" + storage_path
+            ))
+    if binary_path is not None:
+        tasks["ipa"] = (find_and_analyse_ipa, (binary_path,))
+    if not tasks:
+        return results, timings
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(len(tasks))
+    try:
+        pending = dict([
+            (name, pool.apply_async(timed_call, (function,) + args))
+            for name, (function, args) in tasks.items()
+        ])
+        for name, task in pending.items():
+            value, error, elapsed = task.get()
+            results[name] = (value, error)
+            timings[name] = elapsed
+    finally:
+        pool.close()
+        pool.join()
+
+    if cache:
+        account_info, error = results["account_info"]
+        if error:
+            cache.invalidate()
+        else:
+            if "account_info" in tasks:
+                cache.set_account_info(account_info)
+            if "storage_path" in tasks:
+                is_folder, _ = results["storage_path"]
+                if is_folder is not None:
+                    cache.set_folder(storage_path, is_folder)
+            cache.save()
+    return results, timings
+
+
 def get_ipa_file(path):
     if not os.path.exists(path):
         return None
@@ -50,31 +147,46 @@ def get_ipa_file(path):
     return None
 
 
+def get_ipa_files(path, pattern="*.ipa"):
+    if not os.path.exists(path):
+        return []
+    return [
+        os.path.join(path, item)
+        for item in sorted(fnmatch.filter(os.listdir(path), pattern))
+        if os.path.isfile(os.path.join(path, item))
+    ]
+
+
 def analyse_ipa(ipa_file):
-    with zipfile.ZipFile(ipa_file, "r") as ipa:
-        ipa_info = {}
-        files = ipa.namelist()
-        info_plist = fnmatch.filter(files, "Payload/*.app/Info.plist")[0]
-        info_plist_bin = ipa.read(info_plist)
-        try:
-            info = biplist.readPlistFromString(info_plist_bin)
-            ipa_info = info
-        except:
-            pass
-        ipa.close()
-        return ipa_info
-    return None
+    from deploy_ipa import IPAInspector
+    with trace("analyse_ipa", file=os.path.basename(ipa_file)):
+        return IPAInspector(ipa_file).inspect()
 
 
-def parse_macro(match, ipa_info=None, build_info=None):
-    ipa_info = ipa_info or {}
-    build_info = build_info or {}
-    if match.group(1) in build_info:
-        return build_info[match.group(1)]
-    elif match.group(1) in ipa_info:
-        return ipa_info[match.group(1)]
-    else:
-        return ""
+def try_analyse_ipa(ipa_file):
+    try:
+        return analyse_ipa(ipa_file), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+def analyse_ipa_files(ipa_files):
+    from multiprocessing import Pool, cpu_count
+    from multiprocessing.pool import ThreadPool
+    try:
+        processes = cpu_count()
+    except NotImplementedError:
+        processes = 1
+    processes = max(min(processes, len(ipa_files)), 1)
+    try:
+        pool = Pool(processes)
+    except (ImportError, OSError):
+        pool = ThreadPool(processes)
+    try:
+        return pool.map(try_analyse_ipa, ipa_files)
+    finally:
+        pool.close()
+        pool.join()
 
 
 def dump_error(error_message):
@@ -87,214 +199,1012 @@ def dump_error(error_message):
 
 def dump_result(result):
     if DUMP_JSON:
+        import json
         output_file = open(os.path.join(WORKING_DIR, "output.json"), "w")
         json.dump(result, output_file)
         output_file.close()
 
 
 def timestamp_format(timestamp):
+    import datetime
     return datetime.datetime.fromtimestamp(timestamp).strftime(
         "%a, %d %b %Y %H:%M:%S"
     )
 
 
-def upload_file(client, remote_path, local_path):
-    client.put_file("/Public" + remote_path, open(local_path, "r"))
+def create_progress_callback(name, show_line=True):
+    if PROGRESS is None:
+        return None
+    return PROGRESS.create_callback(name, show_line)
 
 
-def deploy(client, settings):
-    setup_mode = settings["setup_mode"]
-    storage_path = settings["storage_path"]
-    ipa_file = settings["ipa_file"]
-    ipa_file_name = settings["ipa_file_name"]
-    ipa_info = settings["ipa_info"]
-    tmp_file = os.path.join(EXEC_DIR, "tmpfile")
+def finish_progress():
+    global PROGRESS
+    if PROGRESS is not None:
+        PROGRESS.close()
+        PROGRESS = None
+
+
+def upload_file(client, remote_path, local_path, progress_callback=None):
+    with trace("upload_file", path=remote_path):
+        with open(local_path, "rb") as local_file:
+            return client.put_file(
+                "/Public" + remote_path, local_file, progress_callback
+            )
+
+
+def encode_content(content):
+    if not isinstance(content, bytes):
+        return content.encode("utf-8")
+    return content
+
+
+def upload_content(client, remote_path, content):
+    content = encode_content(content)
+    with trace("upload_file", path=remote_path, size=len(content)):
+        return client.put_file("/Public" + remote_path, content)
+
+
+def get_content_hash(local_path):
+    from dropbox import DropboxUtil
+    with trace("content_hash"):
+        with open(local_path, "rb") as local_file:
+            return DropboxUtil.get_content_hash(local_file)
+
+
+def find_duplicate_ipa(client, public_app_url, content_hash, build_index=None):
+    if build_index is None:
+        with trace("list_duplicate_ipa"):
+            return list_duplicate_ipa(client, public_app_url, content_hash)
+    for build in build_index["builds"]:
+        if (
+            build.get("content_hash") == content_hash and
+            build.get("ipa_file_name")
+        ):
+            return "%s/%s/%s" % (
+                public_app_url, build["path"], build["ipa_file_name"]
+            )
+    return None
+
+
+def list_duplicate_ipa(client, public_app_url, content_hash):
+    from dropbox import ErrorResponse
+    try:
+        for entry in client.iter_folder(
+            public_app_url, recursive=True, limit=LIST_FOLDER_PAGE_SIZE
+        ):
+            if (
+                entry.get(".tag") == "file" and
+                entry.get("content_hash") == content_hash and
+                entry["path_display"].endswith(".ipa")
+            ):
+                return entry["path_display"]
+    except ErrorResponse:
+        pass
+    return None
+
+
+def parse_build_entry(entry, public_app_url):
+    path_name = entry["path_display"][len(public_app_url) + 1:]
+    matches = re.search("([\\d.]+)-(\\w+)-(\\w+)", path_name)
+    build = {"path": path_name}
+    if matches:
+        build["bundle_version_short"] = matches.group(1)
+        build["bundle_version"] = matches.group(2)
+        build["timestamp"] = int(float(matches.group(3)))
+        build["modified"] = timestamp_format(build["timestamp"])
+    else:
+        build["bundle_version_short"] = ""
+        build["bundle_version"] = path_name
+        build["modified"] = entry["server_modified"]
+    return build
+
+
+def list_builds(client, public_app_url):
+    builds = []
+    for entry in client.iter_folder(
+        public_app_url, limit=LIST_FOLDER_PAGE_SIZE
+    ):
+        if not ".tag" in entry or entry[".tag"] != "folder":
+            continue
+        builds.append(parse_build_entry(entry, public_app_url))
+    builds.sort(
+        key=lambda build: get_build_timestamp(build) or 0, reverse=True
+    )
+    return builds
+
+
+def load_build_index(client, public_app_url):
+    import biplist
+    from dropbox import ErrorResponse
+    try:
+        response = client.get_file(
+            "%s/%s" % (public_app_url, BUILD_INDEX_FILE_NAME)
+        )
+    except ErrorResponse:
+        return None
+    try:
+        build_index = dict(biplist.readPlistFromString(response.read()))
+        build_index["builds"] = list(build_index["builds"])
+        return build_index
+    except:
+        return None
+    finally:
+        response.close()
+
+
+def load_app_build_index(client, app_url, rebuild_index):
+    if rebuild_index:
+        return None
+    with trace("load_build_index"):
+        return load_build_index(client, "/Public" + app_url)
+
+
+def save_build_index(client, public_app_url, build_index):
+    import biplist
+    client.put_file(
+        "%s/%s" % (public_app_url, BUILD_INDEX_FILE_NAME),
+        biplist.writePlistToString(build_index)
+    )
+
+
+def get_app_name(ipa_info):
+    return (
+        ipa_info["CFBundleDisplayName"]
+        if "CFBundleDisplayName" in ipa_info
+        else ipa_info["CFBundleName"]
+    )
+
+
+def load_templates(setup_mode):
     template = {
         "index": "index.html",
         "item": "item.html",
         "new-item": "new-item.html",
+        "page-link": "page-link.html",
+        "client-index": "client-index.html",
         "manifest": "manifest.plist"
     }
     for key in template:
         template[key] = os.path.join(EXEC_DIR, "template", template[key])
-        if key != "new-item" and not os.path.exists(template[key]):
+        if key not in ("new-item", "page-link", "client-index") and not os.path.exists(template[key]):
             if setup_mode:
                 print("Template file for \"%s\" is not found" % (key))
             else:
                 dump_error("Template file for \"%s\" is not found" % (key))
                 exit(1)
-    user_info = client.account_info()
-    public_url = "https://dl.dropboxusercontent.com/u/%s" % (
+    return template
+
+
+def print_overview(ipa_file, ipa_analysis):
+    ipa_info = ipa_analysis["info"]
+    app_name = get_app_name(ipa_info)
+    print("=" * 20)
+    print("Application Overview:")
+    print("%sApplication Name: %s" % (
+        " " * 4, app_name
+    ))
+    print("%sApplication Version: %s" % (
+        " " * 4, ipa_info["CFBundleVersion"]
+    ))
+    print("Application Details:")
+    print("%sBundle Identifier: %s" % (
+        " " * 4, ipa_info["CFBundleIdentifier"]
+    ))
+    print("%sDevice Family: %s" % (
+        " " * 4, ", ".join([
+            "iPhone" if family == 1 else "iPad"
+            for family in ipa_info["UIDeviceFamily"]
+        ])
+    ))
+    print("%sMinimum OS Version: %s" % (
+        " " * 4, ipa_info["MinimumOSVersion"]
+    ))
+    print("%sSize: %s" % (
+        " " * 4, to_readable_size(os.path.getsize(ipa_file))
+    ))
+    provision = ipa_analysis["provision"]
+    if provision:
+        print("Provisioning Profile:")
+        print("%sName: %s" % (" " * 4, provision["name"]))
+        print("%sTeam: %s (%s)" % (
+            " " * 4, provision["team_name"], provision["team_id"]
+        ))
+        print("%sExpiration Date: %s" % (
+            " " * 4, provision["expiration_date"]
+        ))
+        print("%sProvisioned Devices: %s" % (
+            " " * 4,
+            "All" if provision["provisions_all_devices"]
+            else provision["provisioned_devices"]
+        ))
+    print("=" * 20)
+
+
+def get_public_url(client, settings):
+    user_info = settings.get("account_info") or client.account_info()
+    return "https://dl.dropboxusercontent.com/u/%s" % (
         user_info["account_id"]
     )
-    app_name = (
-        ipa_info["CFBundleDisplayName"]
-        if "CFBundleDisplayName" in ipa_info
-        else ipa_info["CFBundleName"]
-    )
+
+
+def create_build(storage_path, ipa_file, ipa_analysis, build_time):
+    ipa_info = ipa_analysis["info"]
+    app_name = get_app_name(ipa_info)
     app_url = "%s/%s" % (storage_path, app_name)
-    ipa_url = "%s/%s-%s-%d/%s" % (
-        app_url,
+    build_path = "%s-%s-%d" % (
         ipa_info["CFBundleShortVersionString"],
         ipa_info["CFBundleVersion"],
-        time.time(),
-        ipa_file_name
-    )
-    manifest_url = "%s/%s-%s-%d/%s" % (
-        app_url,
-        ipa_info["CFBundleShortVersionString"],
-        ipa_info["CFBundleVersion"],
-        time.time(),
-        "manifest.plist"
+        build_time
     )
+    ipa_file_name = os.path.basename(ipa_file)
+    return {
+        "app_name": app_name,
+        "app_url": app_url,
+        "build_path": build_path,
+        "build_time": build_time,
+        "ipa_file": ipa_file,
+        "ipa_file_name": ipa_file_name,
+        "ipa_info": ipa_info,
+        "ipa_analysis": ipa_analysis,
+        "ipa_url": "%s/%s/%s" % (app_url, build_path, ipa_file_name),
+        "manifest_url": "%s/%s/%s" % (app_url, build_path, "manifest.plist")
+    }
+
+
+def get_build_info(public_url, build):
+    return {
+        "APP_NAME": build["app_name"],
+        "IPA_URL": public_url + build["ipa_url"],
+        "MANIFEST_URL": public_url + build["manifest_url"]
+    }
+
+
+def upload_ipa(client, build, show_progress=True, build_index=None):
+    from dropbox import ErrorResponse
+    print("Checking for identical builds...")
+    if "content_hash" not in build:
+        build["content_hash"] = get_content_hash(build["ipa_file"])
+    content_hash = build["content_hash"]
+    with trace("find_duplicate_ipa"):
+        duplicate_ipa = find_duplicate_ipa(
+            client, "/Public" + build["app_url"], content_hash, build_index
+        )
+    if duplicate_ipa:
+        print("Copying identical build from %s..." % (duplicate_ipa))
+        try:
+            with trace("copy_ipa"):
+                client.copy(duplicate_ipa, "/Public" + build["ipa_url"])
+        except ErrorResponse as e:
+            print("warning:Failed to copy %s (%s)" % (duplicate_ipa, e))
+            duplicate_ipa = None
+    if not duplicate_ipa:
+        print("Uploading %s..." % (build["ipa_file_name"]))
+        upload_file(
+            client, build["ipa_url"], build["ipa_file"],
+            create_progress_callback(build["ipa_file_name"], show_progress)
+        )
+    return content_hash, duplicate_ipa
+
 
-    print("Uploading %s..." % (ipa_file_name))
-    upload_file(client, ipa_url, ipa_file)
+def upload_build_files(client, template, public_url, build):
+    from deploy_template import DeployTemplate
+    icon = build["ipa_analysis"].get("icon")
+    icon_url = None
+    if icon:
+        print("Uploading app icon...")
+        icon_url = "%s/%s/%s" % (build["app_url"], build["build_path"], "icon.png")
+        with trace("upload_icon"):
+            client.put_file("/Public" + icon_url, icon["data"])
 
     print("Creating manifest.plist file...")
-    template_manifest_file = open(template["manifest"], "r")
-    template_manifest = template_manifest_file.read()
-    template_manifest_file.close()
+    with trace("manifest", "render"):
+        template_manifest = DeployTemplate.load(template["manifest"]).render(
+            get_build_info(public_url, build), build["ipa_info"]
+        )
+
+    print("Uploading manifest.plist...")
+    upload_content(client, build["manifest_url"], template_manifest)
+    return icon_url
+
+
+def merge_builds(client, public_app_url, deployed_builds, build_index):
+    if build_index is None:
+        print("Build index is not found, listing all builds...")
+        with trace("list_builds"):
+            builds = list_builds(client, public_app_url)
+        build_index = {}
+    else:
+        builds = build_index["builds"]
+    deployed_paths = [build["build_path"] for build in deployed_builds]
+    return [
+        create_build_entry(build) for build in deployed_builds
+    ] + [
+        build for build in builds if build["path"] not in deployed_paths
+    ], build_index
+
+
+def create_build_entry(build):
+    entry = {
+        "path": build["build_path"],
+        "bundle_version": build["ipa_info"]["CFBundleVersion"],
+        "bundle_version_short": build["ipa_info"]["CFBundleShortVersionString"],
+        "modified": timestamp_format(build["build_time"]),
+        "timestamp": build["build_time"],
+        "size": os.path.getsize(build["ipa_file"]),
+        "ipa_file_name": build["ipa_file_name"]
+    }
+    if build.get("content_hash"):
+        entry["content_hash"] = build["content_hash"]
+    if "MinimumOSVersion" in build["ipa_info"]:
+        entry["minimum_os"] = build["ipa_info"]["MinimumOSVersion"]
+    return entry
+
+
+def get_build_timestamp(build):
+    if "timestamp" in build:
+        return build["timestamp"]
+    matches = re.search("-(\\d+)$", build["path"])
+    if matches:
+        return int(matches.group(1))
+    return None
+
+
+def create_build_feed(public_url, app_url, builds, older=None):
+    return {
+        "builds": [{
+            "version": build["bundle_version"],
+            "short_version": build["bundle_version_short"],
+            "timestamp": get_build_timestamp(build),
+            "modified": build["modified"],
+            "manifest_url": public_url + app_url + "/%s/manifest.plist" % (
+                build["path"]
+            ),
+            "size": build.get("size"),
+            "minimum_os": build.get("minimum_os")
+        } for build in builds],
+        "older": older
+    }
+
+
+def format_build_feed(feed):
+    import json
+    return json.dumps(feed, indent=1, sort_keys=True, separators=(",", ": "))
+
+
+def format_script_value(value):
+    import json
+    return json.dumps(value).replace("</", "<\\/")
+
+
+def get_page_numbers(builds):
+    return sorted(set(build["page"] for build in builds if "page" in build))
+
+
+def get_older_page(page_numbers, page):
+    older_pages = [number for number in page_numbers if number < page]
+    if not older_pages:
+        return None
+    return older_pages[-1]
+
+
+def archive_builds(builds, page_size):
+    if not page_size:
+        return []
+    head_builds = [build for build in builds if "page" not in build]
+    page = max(get_page_numbers(builds) or [0])
+    new_pages = []
+    while len(head_builds) > page_size:
+        page += 1
+        for build in head_builds[-page_size:]:
+            build["page"] = page
+        head_builds = head_builds[:-page_size]
+        new_pages.append(page)
+    return new_pages
+
+
+def render_page_links(template, links):
+    from deploy_template import DeployTemplate
+    if not links:
+        return ""
+    link_template = DeployTemplate.load(template["page-link"])
+    return "".join([link_template.render({
+        "PAGE_TITLE": title,
+        "PAGE_URL": url
+    }) for title, url in links])
+
+
+def render_index(template, public_url, builds, deployed_builds, navigation="", feed_updated=""):
+    from deploy_template import DeployTemplate
+    latest_build = deployed_builds[0]
+    app_name = latest_build["app_name"]
+    app_url = latest_build["app_url"]
+    item_template = DeployTemplate.load(template["item"])
+    new_builds = []
+    rendered_builds = []
+    for build in builds:
+        deployed_build = None
+        for candidate in deployed_builds:
+            if build["path"] == candidate["ipa_info"]["CFBundleVersion"]:
+                deployed_build = candidate
+                break
+        if deployed_build and os.path.exists(template["new-item"]):
+            build_info = get_build_info(public_url, deployed_build)
+            build_info["BUNDLE_VERSION"] = (
+                deployed_build["ipa_info"]["CFBundleVersion"]
+            )
+            build_info["MODIFIED"] = build["modified"]
+
+            template_build = DeployTemplate.load(
+                template["new-item"]
+            ).render(build_info, deployed_build["ipa_info"])
+
+            new_builds.append(template_build)
+            continue
+
+        build_item = {
+            "APP_NAME": app_name,
+            "BUNDLE_VERSION": build["bundle_version"],
+            "BUNDLE_VERSION_SHORT": build["bundle_version_short"],
+            "MANIFEST_URL": public_url + app_url + "/%s/manifest.plist" % (
+                build["path"]
+            ),
+            "MODIFIED": build["modified"]
+        }
+
+        template_build = item_template.render(build_item)
+
+        rendered_builds.append(template_build)
+
     build_info = {
         "APP_NAME": app_name,
-        "IPA_URL": public_url + ipa_url,
-        "MANIFEST_URL": public_url + manifest_url
+        "BUILDS": "".join(new_builds + rendered_builds),
+        "NAVIGATION": navigation,
+        "FEED_UPDATED": feed_updated,
+        "APP_NAME_JSON": format_script_value(app_name),
+        "FEED_UPDATED_JSON": format_script_value(feed_updated)
     }
-    template_manifest = MACRO_PATTERN.sub(
-        lambda m: parse_macro(m, ipa_info, build_info),
-        template_manifest
+
+    return DeployTemplate.load(template["index"]).render(
+        build_info, latest_build["ipa_info"]
     )
-    manifest = open(tmp_file, "w")
-    manifest.write(template_manifest)
-    manifest.close()
 
-    print("Uploading manifest.plist...")
-    upload_file(client, manifest_url, tmp_file)
-    os.remove(tmp_file)
 
+def publish_index(client, template, public_url, deployed_builds, build_index, page_size=INDEX_PAGE_SIZE, client_index=False, retention=None, before_upload=None):
     print("Generating builds info...")
+    latest_build = deployed_builds[0]
+    app_url = latest_build["app_url"]
     public_app_url = "/Public" + app_url
-    app_dir_info = client.list_folder(public_app_url)
+    builds, build_index = merge_builds(
+        client, public_app_url, deployed_builds, build_index
+    )
+    all_builds = builds
+    expired_builds = []
+    if retention:
+        expired_builds = get_expired_builds(builds, retention, [
+            build["build_path"] for build in deployed_builds
+        ])
+        builds = [build for build in builds if build not in expired_builds]
+    if not os.path.exists(template["page-link"]):
+        page_size = 0
+    if client_index and not os.path.exists(template["client-index"]):
+        print("warning:Template file for \"client-index\" is not found")
+        client_index = False
 
-    builds = []
-    contents = app_dir_info["entries"]
-    contents.reverse()
-    for entry in contents:
-        if not ".tag" in entry or entry[".tag"] != "folder":
-            continue
-        path_name = entry["path_display"][len(public_app_url) + 1:]
-        if (
-            path_name == ipa_info["CFBundleVersion"] and
-            os.path.exists(template["new-item"])
-        ):
-            template_build_file = open(template["new-item"], "r")
-            template_build = template_build_file.read()
-            template_build_file.close()
+    pages = build_index.get("pages") or {}
+    previous_pages = get_page_numbers(all_builds)
+    if pages.get("format") != INDEX_PAGE_FORMAT:
+        previous_pages = sorted(set(previous_pages).union(
+            range(1, pages.get("count", 0) + 1)
+        ))
+    rewrite_pages = (
+        pages.get("format") != INDEX_PAGE_FORMAT or
+        pages.get("size") != page_size
+    )
+    changed_pages = set(get_page_numbers(expired_builds))
+    if rewrite_pages:
+        for build in all_builds:
+            build.pop("page", None)
+    changed_pages.update(archive_builds(builds, page_size))
+    page_numbers = get_page_numbers(builds)
+    for page in page_numbers:
+        if rewrite_pages or page not in previous_pages or get_older_page(
+            page_numbers, page
+        ) != get_older_page(previous_pages, page):
+            changed_pages.add(page)
 
-            build_info["APP_NAME"] = app_name
-            build_info["BUNDLE_VERSION"] = ipa_info["CFBundleVersion"]
-            build_info["MODIFIED"] = entry["server_modified"]
+    for page in page_numbers:
+        if page not in changed_pages:
+            continue
+        print("Uploading archive page %d..." % (page))
+        page_builds = [build for build in builds if build.get("page") == page]
+        links = [("Latest builds", "index.html")]
+        older_feed = None
+        older_page = get_older_page(page_numbers, page)
+        if older_page:
+            links.append(("Older builds", INDEX_PAGE_FILE_NAME % (older_page)))
+            older_feed = INDEX_PAGE_FEED_FILE_NAME % (older_page)
+        with trace("page", "render", page=page):
+            template_page = render_index(
+                template, public_url, page_builds, deployed_builds,
+                render_page_links(template, links)
+            )
+            page_feed = format_build_feed(create_build_feed(
+                public_url, app_url, page_builds, older_feed
+            ))
+        upload_content(
+            client, "%s/%s" % (app_url, INDEX_PAGE_FILE_NAME % (page)),
+            template_page
+        )
+        upload_content(
+            client, "%s/%s" % (app_url, INDEX_PAGE_FEED_FILE_NAME % (page)),
+            page_feed
+        )
 
-            template_build = MACRO_PATTERN.sub(
-                lambda m: parse_macro(m, ipa_info, build_info),
-                template_build
+    print("Creating HTML page...")
+    head_builds = [build for build in builds if "page" not in build]
+    links = []
+    older_feed = None
+    if page_numbers:
+        links.append(("Older builds", INDEX_PAGE_FILE_NAME % (page_numbers[-1])))
+        older_feed = INDEX_PAGE_FEED_FILE_NAME % (page_numbers[-1])
+    index_hash = None
+    with trace("index", "render"):
+        feed = create_build_feed(public_url, app_url, head_builds, older_feed)
+        feed["app_name"] = latest_build["app_name"]
+        feed["updated"] = latest_build["build_time"]
+        if client_index:
+            from deploy_template import DeployTemplate
+            template_index = DeployTemplate.load(
+                template["client-index"]
+            ).render({
+                "APP_NAME": latest_build["app_name"],
+                "APP_NAME_JSON": format_script_value(
+                    latest_build["app_name"]
+                ),
+                "BUILD_FEED_URL": BUILD_FEED_FILE_NAME,
+                "BUILD_FEED_URL_JSON": format_script_value(
+                    BUILD_FEED_FILE_NAME
+                )
+            }, latest_build["ipa_info"])
+            import hashlib
+            index_hash = hashlib.sha1(
+                encode_content(template_index)
+            ).hexdigest()
+            if index_hash == build_index.get("index_hash"):
+                template_index = None
+        else:
+            template_index = render_index(
+                template, public_url, head_builds, deployed_builds,
+                render_page_links(template, links), str(feed["updated"])
             )
 
-            builds = [template_build] + builds
+    if before_upload:
+        with trace("wait_for_upload"):
+            before_upload()
+
+    if template_index is not None:
+        print("Uploading HTML page...")
+        upload_content(client, app_url + "/index.html", template_index)
+
+    print("Uploading build feed...")
+    upload_content(
+        client, "%s/%s" % (app_url, BUILD_FEED_FILE_NAME),
+        format_build_feed(feed)
+    )
+
+    expired_paths = [
+        "%s/%s" % (public_app_url, build["path"]) for build in expired_builds
+    ]
+    for page in previous_pages:
+        if page in page_numbers:
             continue
-        
-        matches = re.search("([\\d.]+)-(\\w+)-(\\w+)", path_name)
-        if matches:
-            bundle_version_short = matches.group(1)
-            bundle_version = matches.group(2)
-            timestamp = matches.group(3)
-            modified_date = timestamp_format(float(timestamp))
-        else:
-            bundle_version_short = ""
-            bundle_version = path_name
-            modified_date = entry["server_modified"]
-        
-        build = {
-            "APP_NAME": app_name,
-            "BUNDLE_VERSION": bundle_version,
-            "BUNDLE_VERSION_SHORT": bundle_version_short,
-            "MANIFEST_URL": public_url + app_url + "/%s/manifest.plist" % (
-                path_name
-            ),
-            "MODIFIED": modified_date
+        for file_name in (INDEX_PAGE_FILE_NAME, INDEX_PAGE_FEED_FILE_NAME):
+            expired_paths.append("%s/%s" % (public_app_url, file_name % (page)))
+    deleted_paths = []
+    if expired_paths:
+        deleted_paths = delete_expired_paths(client, expired_paths)
+    remaining_builds = [
+        build for build in expired_builds
+        if "%s/%s" % (public_app_url, build["path"]) not in deleted_paths
+    ]
+
+    print("Updating build index...")
+    build_index = {
+        "builds": builds,
+        "pages": {
+            "format": INDEX_PAGE_FORMAT,
+            "size": page_size
         }
+    }
+    if remaining_builds:
+        build_index["builds"] = [
+            build for build in all_builds
+            if build in builds or build in remaining_builds
+        ]
+        del build_index["pages"]
+    if index_hash:
+        build_index["index_hash"] = index_hash
+    with trace("save_build_index"):
+        save_build_index(client, public_app_url, build_index)
+    return deleted_paths
 
-        template_build_file = open(template["item"], "r")
-        template_build = template_build_file.read()
-        template_build_file.close()
 
-        template_build = MACRO_PATTERN.sub(
-            lambda m: parse_macro(m, build),
-            template_build
-        )
+def get_expired_builds(builds, retention, protected_paths):
+    now = time.time()
+    version_counts = {}
+    expired_builds = []
+    builds = sorted([
+        build for build in builds
+        if build["bundle_version_short"] and
+        get_build_timestamp(build) is not None
+    ], key=get_build_timestamp, reverse=True)
+    for index, build in enumerate(builds):
+        version = build["bundle_version_short"]
+        version_counts[version] = version_counts.get(version, 0) + 1
+        if build["path"] in protected_paths:
+            continue
+        if retention.get("keep_last") and index < retention["keep_last"]:
+            continue
+        if (
+            retention.get("keep_per_version") and
+            version_counts[version] <= retention["keep_per_version"]
+        ):
+            continue
+        if (
+            retention.get("max_age") and
+            now - get_build_timestamp(build) <= retention["max_age"]
+        ):
+            continue
+        expired_builds.append(build)
+    return expired_builds
 
-        builds.append(template_build)
 
-    print("Creating HTML page...")
-    template_index_file = open(template["index"], "r")
-    template_index = template_index_file.read()
-    template_index_file.close()
+def delete_expired_paths(client, expired_paths):
+    print("Deleting %d expired files..." % (len(expired_paths)))
+    try:
+        with trace("delete_expired", count=len(expired_paths)):
+            results = client.delete_paths(expired_paths)
+    except Exception as e:
+        print("warning:Failed to delete expired files: %s" % (e))
+        return []
+    deleted_paths = []
+    for path, entry in results:
+        failure = entry.get("failure") or {}
+        lookup_error = failure.get(failure.get(".tag")) or {}
+        if (
+            entry.get(".tag") == "success" or
+            lookup_error.get(".tag") == "not_found"
+        ):
+            deleted_paths.append(path)
+        else:
+            print("warning:Failed to delete %s (%s)" % (
+                path, entry.get(".tag")
+            ))
+    return deleted_paths
 
-    build_info = {
-        "APP_NAME": app_name,
-        "BUILDS": "".join(builds)
+
+def get_build_result(public_url, build, content_hash, duplicate_ipa, icon_url):
+    result = {
+        "name": build["app_name"],
+        "ipa_url": public_url + build["ipa_url"],
+        "manifest_url": public_url + build["manifest_url"],
+        "ipa_file_name": build["ipa_file_name"],
+        "app_url": public_url + build["app_url"],
+        "deploy_url": public_url + build["app_url"] + "/index.html",
+        "feed_url": "%s%s/%s" % (
+            public_url, build["app_url"], BUILD_FEED_FILE_NAME
+        ),
+        "content_hash": content_hash,
+        "duplicate_of": duplicate_ipa,
+        "icon_url": public_url + icon_url if icon_url else None,
+        "provision": build["ipa_analysis"].get("provision")
     }
+    result.update(build["ipa_info"])
+    return result
+
 
-    template_index = MACRO_PATTERN.sub(
-        lambda m: parse_macro(m, ipa_info, build_info),
-        template_index
+def deploy(client, settings):
+    template = load_templates(settings["setup_mode"])
+    public_url = get_public_url(client, settings)
+    build = create_build(
+        settings["storage_path"],
+        settings["ipa_file"],
+        settings.get("ipa_analysis") or {"info": settings["ipa_info"]},
+        int(time.time())
+    )
+    build_index = load_app_build_index(
+        client, build["app_url"], settings.get("rebuild_index")
     )
 
-    index = open(tmp_file, "w")
-    index.write(template_index)
-    index.close()
+    upload_pool = None
+    ipa_upload = []
+    if settings.get("pipeline"):
+        from multiprocessing.pool import ThreadPool
+        build["content_hash"] = get_content_hash(build["ipa_file"])
+        upload_pool = ThreadPool(1)
+        ipa_upload.append(upload_pool.apply_async(upload_ipa, (
+            client, build, False, build_index
+        )))
+    else:
+        ipa_upload.append(upload_ipa(client, build, True, build_index))
+
+    try:
+        icon_url = upload_build_files(client, template, public_url, build)
+
+        def wait_for_upload():
+            if not upload_pool:
+                return
+            print("Waiting for %s upload..." % (build["ipa_file_name"]))
+            ipa_upload[0] = ipa_upload[0].get()
+
+        deleted_paths = publish_index(
+            client, template, public_url, [build], build_index,
+            settings.get("page_size", INDEX_PAGE_SIZE),
+            settings.get("client_index"), settings.get("retention"),
+            wait_for_upload
+        )
+    finally:
+        if upload_pool:
+            upload_pool.terminate()
+            upload_pool.join()
 
-    print("Uploading HTML page...")
-    upload_file(client, app_url + "/index.html", tmp_file)
-    os.remove(tmp_file)
+    content_hash, duplicate_ipa = ipa_upload[0]
 
     print("=" * 20)
-    result = {
-        "name": app_name,
-        "ipa_url": public_url + ipa_url,
-        "manifest_url": public_url + manifest_url,
-        "ipa_file_name": ipa_file_name,
-        "app_url": public_url + app_url,
-        "deploy_url": public_url + app_url + "/index.html"
-    }
-    result.update(ipa_info)
+    result = get_build_result(
+        public_url, build, content_hash, duplicate_ipa, icon_url
+    )
+    result["connections"] = client.connection.get_stats()
+    result["retries"] = client.connection.get_retry_stats()
+    result["deleted"] = deleted_paths
+    result["preflight"] = settings.get("preflight")
+    result["trace"] = get_trace_result()
+    if client.last_upload_session:
+        result["upload_session"] = client.last_upload_session.get_progress()
     dump_result(result)
-    print("Deployment complete: %s" % (public_url + app_url + "/index.html"))
+    print("Deployment complete: %s" % (result["deploy_url"]))
+
+
+def upload_batch_build(client, template, public_url, build, build_index=None):
+    with trace("upload_build", file=build["ipa_file_name"]):
+        content_hash, duplicate_ipa = upload_ipa(
+            client, build, False, build_index
+        )
+        icon_url = upload_build_files(client, template, public_url, build)
+    return get_build_result(
+        public_url, build, content_hash, duplicate_ipa, icon_url
+    )
+
+
+def collect_ipa_analyses(ipa_files):
+    ipa_analyses = []
+    analysis_failures = []
+    for ipa_file, (ipa_analysis, error) in zip(
+        ipa_files, analyse_ipa_files(ipa_files)
+    ):
+        ipa_file_name = os.path.basename(ipa_file)
+        if error or not ipa_analysis["info"]:
+            print("error:%s is corrupted." % (ipa_file_name))
+            analysis_failures.append({
+                "ipa_file_name": ipa_file_name,
+                "error": error or "%s is corrupted." % (ipa_file_name)
+            })
+            continue
+        ipa_info = ipa_analysis["info"]
+        print("%s%s: %s %s (%s, %s)" % (
+            " " * 4, ipa_file_name, get_app_name(ipa_info),
+            ipa_info["CFBundleShortVersionString"],
+            ipa_info["CFBundleVersion"],
+            to_readable_size(os.path.getsize(ipa_file))
+        ))
+        ipa_analyses.append((ipa_file, ipa_analysis))
+    return ipa_analyses, analysis_failures
+
+
+def deploy_batch(client, settings):
+    from multiprocessing.pool import ThreadPool
+    from dropbox import DropboxConnection, DropboxUtil
+    template = load_templates(settings["setup_mode"])
+    public_url = get_public_url(client, settings)
+    build_time = int(time.time())
+    builds = []
+    used_paths = set()
+    for ipa_file, ipa_analysis in settings["ipa_analyses"]:
+        build = create_build(
+            settings["storage_path"], ipa_file, ipa_analysis, build_time
+        )
+        offset = 0
+        while (build["app_url"], build["build_path"]) in used_paths:
+            offset += 1
+            build = create_build(
+                settings["storage_path"], ipa_file, ipa_analysis,
+                build_time + offset
+            )
+        used_paths.add((build["app_url"], build["build_path"]))
+        builds.append(build)
+
+    build_indexes = {}
+    for build in builds:
+        if build["app_url"] not in build_indexes:
+            build_indexes[build["app_url"]] = load_app_build_index(
+                client, build["app_url"], settings.get("rebuild_index")
+            )
+
+    concurrency = max(min(
+        settings.get("batch_concurrency") or BATCH_CONCURRENCY,
+        DropboxConnection.POOL_SIZES[DropboxUtil.API_CONTENT_HOST],
+        len(builds)
+    ), 1)
+    print("Uploading %d builds (%d at once)..." % (len(builds), concurrency))
+    pool = ThreadPool(concurrency)
+    try:
+        uploads = pool.map(lambda build: timed_call(
+            upload_batch_build, client, template, public_url, build,
+            build_indexes[build["app_url"]]
+        ), builds)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = []
+    failures = []
+    apps = []
+    app_builds = {}
+    for build, (result, error, elapsed) in zip(builds, uploads):
+        if error:
+            print("error:Failed to deploy %s: %s" % (
+                build["ipa_file_name"], error
+            ))
+            failures.append((build, error))
+            continue
+        result["elapsed"] = elapsed
+        results.append(result)
+        if build["app_url"] not in app_builds:
+            apps.append(build["app_url"])
+            app_builds[build["app_url"]] = []
+        app_builds[build["app_url"]].append(build)
+
+    deleted_paths = []
+    for app_url in apps:
+        deployed_builds = sorted(
+            app_builds[app_url],
+            key=lambda build: build["build_time"],
+            reverse=True
+        )
+        print("Updating %s..." % (deployed_builds[0]["app_name"]))
+        deleted_paths += publish_index(
+            client, template, public_url, deployed_builds,
+            build_indexes[app_url],
+            settings.get("page_size", INDEX_PAGE_SIZE),
+            settings.get("client_index"), settings.get("retention")
+        )
+
+    print("=" * 20)
+    dump_result({
+        "builds": results,
+        "failed": [{
+            "ipa_file_name": build["ipa_file_name"],
+            "error": str(error)
+        } for build, error in failures] + settings.get("analysis_failures", []),
+        "connections": client.connection.get_stats(),
+        "retries": client.connection.get_retry_stats(),
+        "deleted": deleted_paths,
+        "preflight": settings.get("preflight"),
+        "trace": get_trace_result()
+    })
+    for result in results:
+        print("Deployment complete: %s (%s)" % (
+            result["deploy_url"], result["ipa_file_name"]
+        ))
+    for build, error in failures:
+        if getattr(error, "status", None) == 401:
+            raise error
+    return not failures and not settings.get("analysis_failures")
+
+
+def watch(client, settings, binary_path, pattern):
+    from dropbox import DropboxTracer, ErrorResponse
+    from deploy_watch import DeployWatcher
+    watcher = DeployWatcher(binary_path, pattern)
+    print("Watching %s for new .ipa files (%s)..." % (
+        binary_path, watcher.get_mode()
+    ))
+    for ipa_files in watcher.watch():
+        if DropboxTracer.active:
+            DropboxTracer.active.clear()
+        print("Analysing %d .ipa files..." % (len(ipa_files)))
+        ipa_analyses, analysis_failures = collect_ipa_analyses(ipa_files)
+        try:
+            if len(ipa_analyses) == 1 and not analysis_failures:
+                ipa_file, ipa_analysis = ipa_analyses[0]
+                print_overview(ipa_file, ipa_analysis)
+                deploy(client, dict(
+                    settings,
+                    ipa_file=ipa_file,
+                    ipa_file_name=os.path.basename(ipa_file),
+                    ipa_info=ipa_analysis["info"],
+                    ipa_analysis=ipa_analysis
+                ))
+            elif ipa_analyses or analysis_failures:
+                deploy_batch(client, dict(
+                    settings,
+                    ipa_analyses=ipa_analyses,
+                    analysis_failures=analysis_failures
+                ))
+        except ErrorResponse as e:
+            if e.status == 401:
+                raise
+            print("error:Deployment failed: %s" % (e))
+        except Exception as e:
+            print("error:Deployment failed: %s" % (e))
+        print("Watching %s for new .ipa files..." % (binary_path))
 
 
 def run(args):
     if "--help" in args:
         print("Usage: python deploy.py [option] ...")
         print("Options")
+        print("--batch\t\t\t: Deploy every .ipa file in binary path")
+        print("--batch-concurrency <n>\t: Number of builds uploaded at once")
+        print("--batch-pattern <glob>\t: Pattern of .ipa files in batch and watch mode")
         print("--binary-path <path>\t: Local path contains built .ipa files")
         print("--clear\t\t\t: Remove previously store informations")
+        print("--client-index\t\t: Render the deployment page in the browser from builds.json")
+        print("--daemon\t\t: Run as daemon accepting jobs from deploy_daemon.py")
+        print("--daemon-socket <path>\t: Unix socket path used by the daemon")
         print("--help\t\t\t: Print this help message")
         print("--json\t\t\t: Generate output as json file")
+        print("--keep-last <n>\t\t: Retention: keep the latest n builds of each app")
+        print("--keep-per-version <n>\t: Retention: keep the latest n builds of each short version")
+        print("--max-age <days>\t: Retention: keep builds younger than the given number of days")
+        print("\t\t\t  Other builds are deleted, a build kept by any retention option stays")
+        print("--page-size <n>\t\t: Number of builds per index page, 0 for a single page")
+        print("--pipeline\t\t: Prepare manifest and index during upload")
+        print("--progress-events <path|fd>\t: Write upload progress as JSON lines")
+        print("--rebuild-index\t\t: Rebuild build index from Dropbox folder")
         print("--setup\t\t\t: Enter setup mode when informations is outdated")
         print("--storage-path <path>\t: Dropbox path to store .ipa files")
+        print("--trace <path>\t\t: Save Chrome trace events of the deployment")
         print("--store-app-info\t: Save app key and app secret")
+        print("--upload-concurrency <n>\t: Number of chunks uploaded at once")
         print("--upload-file <path>\t: Directly upload file to Dropbox")
+        print("--watch\t\t\t: Deploy new .ipa files as they appear in binary path")
         exit(0)
 
     if "--clear" in args:
         os.remove(os.path.join(WORKING_DIR, ".iosdeploy"))
+        if os.path.exists(os.path.join(WORKING_DIR, CACHE_FILE_NAME)):
+            os.remove(os.path.join(WORKING_DIR, CACHE_FILE_NAME))
+        exit(0)
+
+    if "--daemon" in args:
+        socket_path = None
+        if "--daemon-socket" in args:
+            index = args.index("--daemon-socket")
+            if index + 1 >= len(args):
+                dump_error("Expected path for daemon socket option")
+                exit(1)
+            socket_path = args[index + 1]
+        from deploy_daemon import DeployDaemon
+        daemon = DeployDaemon(run_job, socket_path)
+        print("Listening on %s..." % (daemon.socket_path))
+        try:
+            daemon.serve()
+        except KeyboardInterrupt:
+            pass
         exit(0)
 
     app_key = None
     app_secret = None
     setup_mode = "--setup" in args
     store_app_info = "--store-app-info" in args
-    global DUMP_JSON
+    rebuild_index = "--rebuild-index" in args
+    pipeline = "--pipeline" in args
+    batch_mode = "--batch" in args
+    watch_mode = "--watch" in args
+    client_index = "--client-index" in args
+    global DUMP_JSON, PROGRESS
     DUMP_JSON = "--json" in args
     while "--json" in args:
         args.remove("--json")
@@ -302,11 +1212,29 @@ def run(args):
         args.remove("--setup")
     while "--store-app-info" in args:
         args.remove("--store-app-info")
+    while "--rebuild-index" in args:
+        args.remove("--rebuild-index")
+    while "--pipeline" in args:
+        args.remove("--pipeline")
+    while "--batch" in args:
+        args.remove("--batch")
+    while "--watch" in args:
+        args.remove("--watch")
+    while "--client-index" in args:
+        args.remove("--client-index")
     access_token = None
     binary_path = None
     upload_file_path = None
+    upload_concurrency = 1
+    batch_pattern = "*.ipa"
+    batch_concurrency = BATCH_CONCURRENCY
+    page_size = INDEX_PAGE_SIZE
+    retention = {}
+    trace_path = None
+    progress_events = None
     storage_path = "/Deployment"
     client = None
+    cache = None
 
     if os.path.exists(os.path.join(WORKING_DIR, ".iosdeploy")):
         config = open(os.path.join(WORKING_DIR, ".iosdeploy"), "r")
@@ -330,19 +1258,6 @@ def run(args):
                     binary_path = value
         config.close()
 
-        client = DropboxClient(access_token, EXEC_DIR)
-        try:
-            print("Validating access token...")
-            client.account_info()
-        except Exception as e:
-            if setup_mode:
-                print("Access token has expired")
-            else:
-                dump_error("Previous access token has expired")
-                exit(1)
-            client = None
-            access_token = None
-
     while args:
         if args[0] == "--storage-path":
             del args[0]
@@ -371,6 +1286,73 @@ def run(args):
                     dump_error("Expected path for upload file option")
                 exit(1)
             upload_file_path = args[0]
+        elif args[0] == "--upload-concurrency":
+            del args[0]
+            if not args or not args[0].isdigit():
+                if setup_mode:
+                    print("Expected number for upload concurrency option")
+                else:
+                    dump_error("Expected number for upload concurrency option")
+                exit(1)
+            upload_concurrency = int(args[0])
+        elif args[0] == "--progress-events":
+            del args[0]
+            if not args:
+                if setup_mode:
+                    print("Expected path or file descriptor for progress events option")
+                else:
+                    dump_error("Expected path or file descriptor for progress events option")
+                exit(1)
+            progress_events = args[0]
+        elif args[0] == "--trace":
+            del args[0]
+            if not args:
+                if setup_mode:
+                    print("Expected path for trace option")
+                else:
+                    dump_error("Expected path for trace option")
+                exit(1)
+            trace_path = os.path.abspath(args[0])
+        elif args[0] == "--batch-pattern":
+            del args[0]
+            if not args:
+                if setup_mode:
+                    print("Expected pattern for batch pattern option")
+                else:
+                    dump_error("Expected pattern for batch pattern option")
+                exit(1)
+            batch_pattern = args[0]
+        elif args[0] == "--batch-concurrency":
+            del args[0]
+            if not args or not args[0].isdigit():
+                if setup_mode:
+                    print("Expected number for batch concurrency option")
+                else:
+                    dump_error("Expected number for batch concurrency option")
+                exit(1)
+            batch_concurrency = int(args[0])
+        elif args[0] == "--page-size":
+            del args[0]
+            if not args or not args[0].isdigit():
+                if setup_mode:
+                    print("Expected number for page size option")
+                else:
+                    dump_error("Expected number for page size option")
+                exit(1)
+            page_size = int(args[0])
+        elif args[0] in ("--keep-last", "--keep-per-version", "--max-age"):
+            option = args[0]
+            del args[0]
+            if not args or not args[0].isdigit() or not int(args[0]):
+                if setup_mode:
+                    print("Expected positive number for %s option" % (option))
+                else:
+                    dump_error("Expected positive number for %s option" % (option))
+                exit(1)
+            if option == "--max-age":
+                retention["max_age"] = int(args[0]) * 24 * 60 * 60
+            else:
+                retention[option[2:].replace("-", "_")] = int(args[0])
         del args[0]
 
     if not setup_mode and not access_token:
@@ -381,6 +1363,65 @@ def run(args):
         )
         exit(1)
 
+    from dropbox import DropboxAuth, DropboxClient, DropboxTracer, ErrorResponse
+    from deploy_cache import DeployCache
+
+    if DUMP_JSON or trace_path:
+        DropboxTracer.start("run", trace_path)
+
+    show_progress = hasattr(sys.stdout, "isatty") and sys.stdout.isatty()
+    if progress_events or show_progress:
+        from deploy_progress import DeployProgressReporter
+        PROGRESS = DeployProgressReporter(
+            DeployProgressReporter.open_events(progress_events)
+            if progress_events else None,
+            show_progress,
+            to_readable_size
+        )
+
+    if access_token:
+        client = DropboxClient(access_token, EXEC_DIR)
+        cache = DeployCache(
+            os.path.join(WORKING_DIR, CACHE_FILE_NAME), access_token
+        )
+
+    account_info = None
+    preflight_results = {}
+    preflight_timings = {}
+    if client:
+        deploy_checks = not upload_file_path and is_binary_path_valid(
+            binary_path
+        )
+        print("Validating access token...")
+        with trace("preflight"):
+            preflight_results, preflight_timings = preflight(
+                client,
+                storage_path if deploy_checks else None,
+                binary_path if deploy_checks and not (
+                    batch_mode or watch_mode
+                ) else None,
+                cache
+            )
+        print("Pre-flight checks finished (%s)" % (", ".join([
+            "%s: %s" % (
+                name,
+                "%.0fms" % (preflight_timings[name] * 1000)
+                if name in preflight_timings else "cached"
+            )
+            for name in sorted(preflight_results)
+        ])))
+        account_info, error = preflight_results["account_info"]
+        if error:
+            if setup_mode:
+                print("Access token has expired")
+            else:
+                dump_error("Previous access token has expired")
+                exit(1)
+            client = None
+            access_token = None
+            account_info = None
+            preflight_results = {}
+
     while not access_token:
         while True:
             if not app_key:
@@ -409,6 +1450,9 @@ def run(args):
             first_time = False
 
         client = DropboxClient(access_token, EXEC_DIR)
+        cache = DeployCache(
+            os.path.join(WORKING_DIR, CACHE_FILE_NAME), access_token
+        )
         while True:
             path = raw_input(
                 "Enter Dropbox path to store .ipa files [%s]: " % (storage_path)
@@ -444,15 +1488,13 @@ def run(args):
         upload_file(
             client or DropboxClient(access_token, EXEC_DIR),
             "%s/%s" % (storage_path, os.path.basename(upload_file_path)),
-            upload_file_path
+            upload_file_path,
+            create_progress_callback(os.path.basename(upload_file_path))
         )
         return
 
     print("Validating output .ipa path [%s]..." % (binary_path))
-    if (
-        not binary_path or
-        (os.path.exists(binary_path) and not os.path.isdir(binary_path))
-    ):
+    if not is_binary_path_valid(binary_path):
         if setup_mode:
             print("Invalid .ipa path.")
         else:
@@ -460,7 +1502,10 @@ def run(args):
         exit(1)
 
     print("Validating storage path [%s]..." % ("/Public" + storage_path))
-    path_validation = validate_path(client, "/Public" + storage_path)
+    if "storage_path" in preflight_results:
+        path_validation, _ = preflight_results["storage_path"]
+    else:
+        path_validation = validate_path(client, "/Public" + storage_path)
     if path_validation is not None and not path_validation:
         if setup_mode:
             print("Target path is not a directory")
@@ -468,7 +1513,77 @@ def run(args):
             dump_error("Target path is not a directory")
         exit(1)
 
-    ipa_file = get_ipa_file(binary_path)
+    if watch_mode:
+        if not os.path.exists(binary_path):
+            os.makedirs(binary_path)
+        client = client or DropboxClient(access_token, EXEC_DIR)
+        client.concurrency = upload_concurrency
+        try:
+            watch(client, {
+                "setup_mode": setup_mode,
+                "storage_path": storage_path,
+                "batch_concurrency": batch_concurrency,
+                "rebuild_index": rebuild_index,
+                "page_size": page_size,
+                "client_index": client_index,
+                "retention": retention,
+                "pipeline": pipeline,
+                "account_info": account_info,
+                "preflight": preflight_timings
+            }, binary_path, batch_pattern)
+        except KeyboardInterrupt:
+            pass
+        except ErrorResponse as e:
+            if e.status == 401 and cache:
+                cache.invalidate()
+            raise
+        return
+
+    if batch_mode:
+        ipa_files = get_ipa_files(binary_path, batch_pattern)
+        if not ipa_files:
+            if setup_mode:
+                print(".ipa file is not found. The deployment will be skipped.")
+            else:
+                print(
+                    "warning:.ipa file is not found. " +
+                    "The deployment will be skipped."
+                )
+            exit(0)
+        print("Analysing %d .ipa files..." % (len(ipa_files)))
+        ipa_analyses, analysis_failures = collect_ipa_analyses(ipa_files)
+        client = client or DropboxClient(access_token, EXEC_DIR)
+        client.concurrency = upload_concurrency
+        try:
+            succeeded = deploy_batch(client, {
+                "setup_mode": setup_mode,
+                "storage_path": storage_path,
+                "ipa_analyses": ipa_analyses,
+                "analysis_failures": analysis_failures,
+                "batch_concurrency": batch_concurrency,
+                "rebuild_index": rebuild_index,
+                "page_size": page_size,
+                "client_index": client_index,
+                "retention": retention,
+                "account_info": account_info,
+                "preflight": preflight_timings
+            })
+        except ErrorResponse as e:
+            if e.status == 401 and cache:
+                cache.invalidate()
+            raise
+        if not succeeded:
+            exit(1)
+        return
+
+    ipa_analysis = None
+    if "ipa" in preflight_results:
+        ipa_result, error = preflight_results["ipa"]
+        if error:
+            raise error
+        ipa_file, ipa_analysis = ipa_result
+    else:
+        ipa_file = get_ipa_file(binary_path)
     if not ipa_file:
         if setup_mode:
             print(".ipa file is not found. The deployment will be skipped.")
@@ -480,52 +1595,63 @@ def run(args):
         exit(0)
     ipa_file_name = os.path.basename(ipa_file)
     print("Analysing %s..." % (ipa_file_name))
-    ipa_info = analyse_ipa(ipa_file)
-    app_name = (
-        ipa_info["CFBundleDisplayName"]
-        if "CFBundleDisplayName" in ipa_info
-        else ipa_info["CFBundleName"]
-    )
+    if ipa_analysis is None:
+        ipa_analysis = analyse_ipa(ipa_file)
+    ipa_info = ipa_analysis["info"]
     if ipa_info:
-        print("=" * 20)
-        print("Application Overview:")
-        print("%sApplication Name: %s" % (
-            " " * 4, app_name
-        ))
-        print("%sApplication Version: %s" % (
-            " " * 4, ipa_info["CFBundleVersion"]
-        ))
-        print("Application Details:")
-        print("%sBundle Identifier: %s" % (
-            " " * 4, ipa_info["CFBundleIdentifier"]
-        ))
-        print("%sDevice Family: %s" % (
-            " " * 4, ", ".join([
-                "iPhone" if family == 1 else "iPad"
-                for family in ipa_info["UIDeviceFamily"]
-            ])
-        ))
-        print("%sMinimum OS Version: %s" % (
-            " " * 4, ipa_info["MinimumOSVersion"]
-        ))
-        print("%sSize: %s" % (
-            " " * 4, to_readable_size(os.path.getsize(ipa_file))
-        ))
-        print("=" * 20)
+        print_overview(ipa_file, ipa_analysis)
     else:
         if setup_mode:
             print("%s is corrupted." % (ipa_file_name))
         else:
             dump_error("%s is corrupted." % (ipa_file_name))
         exit(1)
-    deploy(client or DropboxClient(access_token, EXEC_DIR), {
-        "setup_mode": setup_mode,
-        "storage_path": storage_path,
-        "ipa_file": ipa_file,
-        "ipa_file_name": ipa_file_name,
-        "ipa_info": ipa_info
-    })
+    client = client or DropboxClient(access_token, EXEC_DIR)
+    client.concurrency = upload_concurrency
+    try:
+        deploy(client, {
+            "setup_mode": setup_mode,
+            "storage_path": storage_path,
+            "ipa_file": ipa_file,
+            "ipa_file_name": ipa_file_name,
+            "ipa_info": ipa_info,
+            "ipa_analysis": ipa_analysis,
+            "rebuild_index": rebuild_index,
+            "page_size": page_size,
+            "client_index": client_index,
+            "retention": retention,
+            "pipeline": pipeline,
+            "account_info": account_info,
+            "preflight": preflight_timings
+        })
+    except ErrorResponse as e:
+        if e.status == 401 and cache:
+            cache.invalidate()
+        raise
+
+
+def close_connections():
+    if "dropbox" in sys.modules:
+        from dropbox import DropboxConnection
+        DropboxConnection.close_shared()
+
+
+def run_job(args):
+    global WORKING_DIR, DUMP_JSON
+    WORKING_DIR = os.getcwd()
+    DUMP_JSON = False
+    try:
+        run(args)
+    finally:
+        finish_trace()
+        finish_progress()
+    return 0
 
 
 if __name__ == "__main__":
-    run(sys.argv)
+    try:
+        run(sys.argv)
+    finally:
+        finish_trace()
+        finish_progress()
+        close_connections()
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import time
+
+
+class DeployCache:
+    ACCOUNT_TTL = 60 * 60
+    FOLDER_TTL = 24 * 60 * 60
+
+    def __init__(self, path, access_token):
+        self.path = path
+        self.token_key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+        self.data = self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self.empty()
+        try:
+            cache_file = open(self.path, "r")
+            try:
+                data = json.load(cache_file)
+            finally:
+                cache_file.close()
+        except (IOError, OSError, ValueError):
+            return self.empty()
+        if not isinstance(data, dict) or data.get("token") != self.token_key:
+            return self.empty()
+        return data
+
+    def empty(self):
+        return {
+            "token": self.token_key,
+            "account": None,
+            "folders": {}
+        }
+
+    @staticmethod
+    def is_fresh(entry, ttl):
+        return (
+            isinstance(entry, dict) and
+            time.time() - entry.get("checked_at", 0) < ttl
+        )
+
+    def get_account_info(self):
+        account = self.data.get("account")
+        if DeployCache.is_fresh(account, DeployCache.ACCOUNT_TTL):
+            return account["info"]
+        return None
+
+    def set_account_info(self, account_info):
+        self.data["account"] = {
+            "info": account_info,
+            "checked_at": time.time()
+        }
+
+    def get_folder(self, path):
+        folder = self.data["folders"].get(path)
+        if DeployCache.is_fresh(folder, DeployCache.FOLDER_TTL):
+            return folder["is_folder"]
+        return None
+
+    def set_folder(self, path, is_folder):
+        self.data["folders"][path] = {
+            "is_folder": is_folder,
+            "checked_at": time.time()
+        }
+
+    def invalidate(self):
+        self.data = self.empty()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def save(self):
+        tmp_path = "%s.%d" % (self.path, os.getpid())
+        cache_file = open(tmp_path, "w")
+        try:
+            json.dump(self.data, cache_file)
+        finally:
+            cache_file.close()
+        os.rename(tmp_path, self.path)
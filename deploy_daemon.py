@@ -0,0 +1,294 @@
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+DAEMON_SOCKET = os.path.join(
+    tempfile.gettempdir(), "iosdeploy-%d.sock" % (os.getuid())
+)
+
+
+class DeployDaemonClient:
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or DAEMON_SOCKET
+
+    def request(self, message):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.socket_path)
+            connection.sendall((json.dumps(message) + "\n").encode("utf-8"))
+            response = connection.makefile("rb").readline()
+        finally:
+            connection.close()
+        if not response:
+            raise socket.error("Daemon closed the connection")
+        return json.loads(response.decode("utf-8"))
+
+    def is_running(self):
+        try:
+            self.request({"command": "status"})
+            return True
+        except (socket.error, ValueError):
+            return False
+
+    def submit(self, args, cwd, wait=True):
+        return self.request({
+            "command": "deploy",
+            "args": args,
+            "cwd": cwd,
+            "wait": wait
+        })
+
+
+class DeployDaemon:
+    ACCEPT_TIMEOUT = 1.0
+    BACKLOG = 16
+    UNSUPPORTED_OPTIONS = ("--setup", "--daemon", "--watch")
+
+    def __init__(self, handler, socket_path=None):
+        self.handler = handler
+        self.socket_path = socket_path or DAEMON_SOCKET
+        self.jobs = queue.Queue()
+        self.job_count = 0
+        self.lock = threading.Lock()
+        self.running = False
+        self.current_job = None
+
+    def bind(self):
+        if os.path.exists(self.socket_path):
+            if DeployDaemonClient(self.socket_path).is_running():
+                raise socket.error(
+                    "Daemon is already listening on %s" % (self.socket_path)
+                )
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        server.listen(DeployDaemon.BACKLOG)
+        server.settimeout(DeployDaemon.ACCEPT_TIMEOUT)
+        return server
+
+    def serve(self):
+        server = self.bind()
+        self.running = True
+        worker = threading.Thread(target=self.work)
+        worker.daemon = True
+        worker.start()
+        try:
+            while self.running:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    continue
+                connection.settimeout(None)
+                thread = threading.Thread(
+                    target=self.handle, args=(connection,)
+                )
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.running = False
+            self.jobs.put(None)
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            worker.join()
+
+    def stop(self):
+        self.running = False
+
+    def get_status(self):
+        with self.lock:
+            return {
+                "status": "running",
+                "pid": os.getpid(),
+                "jobs": self.job_count,
+                "pending": self.jobs.qsize(),
+                "current_job": self.current_job
+            }
+
+    def handle(self, connection):
+        try:
+            request = connection.makefile("rb").readline()
+            try:
+                request = json.loads(request.decode("utf-8"))
+            except ValueError:
+                request = {}
+            command = request.get("command")
+            if command == "status":
+                response = self.get_status()
+            elif command == "stop":
+                self.stop()
+                response = {"status": "stopping"}
+            elif command == "deploy":
+                response = self.enqueue(request)
+            else:
+                response = {"status": "error", "error": "Unknown command"}
+            connection.sendall((json.dumps(response) + "\n").encode("utf-8"))
+        except socket.error:
+            pass
+        finally:
+            connection.close()
+
+    @staticmethod
+    def find_unsupported_option(args):
+        for arg in args:
+            if arg in DeployDaemon.UNSUPPORTED_OPTIONS:
+                return arg
+        return None
+
+    def enqueue(self, request):
+        option = DeployDaemon.find_unsupported_option(
+            request.get("args") or []
+        )
+        if option:
+            return {
+                "status": "error",
+                "error": "%s is not supported through the daemon" % (option)
+            }
+        with self.lock:
+            self.job_count += 1
+            job = {
+                "id": self.job_count,
+                "args": list(request.get("args") or []),
+                "cwd": request.get("cwd") or os.getcwd(),
+                "done": threading.Event(),
+                "result": None
+            }
+        self.jobs.put(job)
+        if not request.get("wait", True):
+            return {"status": "queued", "job": job["id"]}
+        job["done"].wait()
+        return job["result"]
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            with self.lock:
+                self.current_job = job["id"]
+            job["result"] = self.run_job(job)
+            with self.lock:
+                self.current_job = None
+            job["done"].set()
+            print("Job %d finished with exit code %d in %.2fs (%s)" % (
+                job["id"], job["result"]["exit_code"],
+                job["result"]["elapsed"], job["cwd"]
+            ))
+
+    def run_job(self, job):
+        output = StringIO()
+        stdout = sys.stdout
+        cwd = os.getcwd()
+        started = time.time()
+        exit_code = 0
+        sys.stdout = output
+        try:
+            os.chdir(job["cwd"])
+            exit_code = self.handler(job["args"]) or 0
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                print(e.code)
+                exit_code = 1
+        except Exception:
+            traceback.print_exc(file=output)
+            exit_code = 1
+        finally:
+            sys.stdout = stdout
+            os.chdir(cwd)
+        return {
+            "status": "finished",
+            "job": job["id"],
+            "exit_code": exit_code,
+            "output": output.getvalue(),
+            "elapsed": time.time() - started
+        }
+
+
+def run_client(args):
+    socket_path = None
+    wait = True
+    command = "deploy"
+    deploy_args = []
+    events_fd = False
+    args = args[1:]
+    while args:
+        if args[0] == "--daemon-socket":
+            del args[0]
+            if not args:
+                print("error:Expected path for daemon socket option")
+                return 1
+            socket_path = args[0]
+        elif args[0] == "--no-wait":
+            wait = False
+        elif args[0] == "--daemon-status":
+            command = "status"
+        elif args[0] == "--daemon-stop":
+            command = "stop"
+        elif args[0] in DeployDaemon.UNSUPPORTED_OPTIONS:
+            print("error:%s is not supported through the daemon" % (args[0]))
+            return 1
+        else:
+            if deploy_args and deploy_args[-1] == "--progress-events":
+                events_fd = args[0].isdigit()
+            deploy_args.append(args[0])
+        del args[0]
+
+    client = DeployDaemonClient(socket_path)
+    try:
+        if command != "deploy":
+            print(json.dumps(client.request({"command": command})))
+            return 0
+        if events_fd and client.is_running():
+            print("error:--progress-events only accepts a path through the daemon")
+            return 1
+        result = client.submit(
+            ["deploy.py"] + deploy_args, os.getcwd(), wait
+        )
+    except (socket.error, ValueError):
+        if command != "deploy":
+            print("error:iOSDeploy daemon is not running")
+            return 1
+        print("warning:iOSDeploy daemon is not running, deploying directly")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import deploy
+        try:
+            return deploy.run_job(["deploy.py"] + deploy_args)
+        finally:
+            deploy.close_connections()
+
+    if result.get("status") == "queued":
+        print("Deployment queued as job %d" % (result["job"]))
+        return 0
+    if result.get("status") != "finished":
+        print("error:%s" % (result.get("error", "Unexpected daemon response")))
+        return 1
+    sys.stdout.write(result["output"])
+    return result["exit_code"]
+
+
+if __name__ == "__main__":
+    sys.exit(run_client(sys.argv))
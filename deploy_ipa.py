@@ -0,0 +1,234 @@
+import biplist
+import calendar
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+
+
+class IPAInspector:
+    END_OF_CENTRAL_DIRECTORY_SIGNATURE = b"PK\x05\x06"
+    END_OF_CENTRAL_DIRECTORY_FORMAT = "<4s4H2LH"
+    END_OF_CENTRAL_DIRECTORY_SEARCH_SIZE = 22 + 65535
+    CENTRAL_DIRECTORY_SIGNATURE = b"PK\x01\x02"
+    CENTRAL_DIRECTORY_FORMAT = "<4s6H3L5H2L"
+    LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+    LOCAL_HEADER_FORMAT = "<4s5H3L2H"
+    ZIP64_LIMIT = 0xFFFFFFFF
+    ZIP64_COUNT_LIMIT = 0xFFFF
+
+    def __init__(self, ipa_file):
+        self.ipa_file = ipa_file
+        self.entries_scanned = 0
+
+    @staticmethod
+    def classify_member(name):
+        if not name.startswith(b"Payload/") or name.count(b"/") != 2:
+            return None
+        if name.endswith(b".app/Info.plist"):
+            return "info_plist"
+        if name.endswith(b".app/embedded.mobileprovision"):
+            return "mobileprovision"
+        if name.endswith(b".png") and b".app/" in name:
+            return "icon"
+        return None
+
+    def find_members(self, data, matcher):
+        search_start = max(
+            len(data) - IPAInspector.END_OF_CENTRAL_DIRECTORY_SEARCH_SIZE, 0
+        )
+        eocd_offset = data.rfind(
+            IPAInspector.END_OF_CENTRAL_DIRECTORY_SIGNATURE, search_start
+        )
+        if eocd_offset < 0:
+            raise zipfile.BadZipfile("End of central directory is not found")
+        (
+            _, _, _, _, total_entries, _, directory_offset, _
+        ) = struct.unpack_from(
+            IPAInspector.END_OF_CENTRAL_DIRECTORY_FORMAT, data, eocd_offset
+        )
+        if (
+            total_entries == IPAInspector.ZIP64_COUNT_LIMIT or
+            directory_offset == IPAInspector.ZIP64_LIMIT
+        ):
+            return NotImplemented
+
+        members = []
+        header_size = struct.calcsize(IPAInspector.CENTRAL_DIRECTORY_FORMAT)
+        position = directory_offset
+        for _ in range(total_entries):
+            (
+                signature, _, _, flags, method, _, _, crc,
+                compressed_size, size, name_length, extra_length,
+                comment_length, _, _, _, local_offset
+            ) = struct.unpack_from(
+                IPAInspector.CENTRAL_DIRECTORY_FORMAT, data, position
+            )
+            if signature != IPAInspector.CENTRAL_DIRECTORY_SIGNATURE:
+                raise zipfile.BadZipfile("Invalid central directory entry")
+            self.entries_scanned += 1
+            name_start = position + header_size
+            name = data[name_start:name_start + name_length]
+            position = (
+                name_start + name_length + extra_length + comment_length
+            )
+            kind = matcher(name)
+            if not kind:
+                continue
+            if (
+                flags & 0x1 or
+                compressed_size == IPAInspector.ZIP64_LIMIT or
+                local_offset == IPAInspector.ZIP64_LIMIT or
+                method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+            ):
+                return NotImplemented
+            members.append({
+                "kind": kind,
+                "name": name.decode("utf-8", "replace"),
+                "method": method,
+                "crc": crc,
+                "compressed_size": compressed_size,
+                "size": size,
+                "local_offset": local_offset
+            })
+        return members
+
+    def read_member(self, data, member):
+        header_size = struct.calcsize(IPAInspector.LOCAL_HEADER_FORMAT)
+        fields = struct.unpack_from(
+            IPAInspector.LOCAL_HEADER_FORMAT, data, member["local_offset"]
+        )
+        if fields[0] != IPAInspector.LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipfile("Invalid local file header")
+        data_start = (
+            member["local_offset"] + header_size + fields[9] + fields[10]
+        )
+        content = data[data_start:data_start + member["compressed_size"]]
+        if member["method"] == zipfile.ZIP_DEFLATED:
+            content = zlib.decompress(content, -zlib.MAX_WBITS)
+        if zlib.crc32(content) & 0xFFFFFFFF != member["crc"]:
+            raise zipfile.BadZipfile("Bad CRC-32 for %s" % (member["name"]))
+        return content
+
+    def open_archive(self, ipa):
+        try:
+            return mmap.mmap(ipa.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            raise zipfile.BadZipfile("File is empty")
+
+    def inspect(self):
+        with open(self.ipa_file, "rb") as ipa:
+            data = self.open_archive(ipa)
+            try:
+                members = self.find_members(
+                    data, IPAInspector.classify_member
+                )
+                if members is not NotImplemented:
+                    return self.extract(
+                        members, lambda member: self.read_member(data, member)
+                    )
+            finally:
+                data.close()
+        with zipfile.ZipFile(self.ipa_file, "r") as ipa:
+            members = []
+            for zip_info in ipa.infolist():
+                name = zip_info.filename
+                if not isinstance(name, bytes):
+                    name = name.encode("utf-8")
+                kind = IPAInspector.classify_member(name)
+                if kind:
+                    members.append({
+                        "kind": kind,
+                        "name": zip_info.filename,
+                        "size": zip_info.file_size
+                    })
+            self.entries_scanned = len(ipa.infolist())
+            return self.extract(
+                members, lambda member: ipa.read(member["name"])
+            )
+
+    def extract(self, members, read):
+        result = {
+            "info": {},
+            "provision": None,
+            "icon": None
+        }
+        icons = []
+        for member in members:
+            if member["kind"] == "info_plist" and not result["info"]:
+                try:
+                    result["info"] = biplist.readPlistFromString(read(member))
+                except:
+                    pass
+            elif member["kind"] == "mobileprovision" and not result["provision"]:
+                result["provision"] = IPAInspector.parse_provision(read(member))
+            elif member["kind"] == "icon":
+                icons.append(member)
+        icon = IPAInspector.find_primary_icon(result["info"], icons)
+        if icon:
+            result["icon"] = {
+                "name": os.path.basename(icon["name"]),
+                "size": icon["size"],
+                "data": read(icon)
+            }
+        return result
+
+    @staticmethod
+    def get_icon_names(info):
+        names = []
+        for key in ("CFBundleIcons", "CFBundleIcons~ipad"):
+            primary_icon = (info.get(key) or {}).get("CFBundlePrimaryIcon")
+            if isinstance(primary_icon, dict):
+                names += primary_icon.get("CFBundleIconFiles") or []
+        names += info.get("CFBundleIconFiles") or []
+        if info.get("CFBundleIconFile"):
+            names.append(info["CFBundleIconFile"])
+        return [os.path.splitext(name)[0] for name in names if name]
+
+    @staticmethod
+    def find_primary_icon(info, icons):
+        icon_names = IPAInspector.get_icon_names(info)
+        primary_icon = None
+        for icon in icons:
+            file_name = os.path.basename(icon["name"])
+            if not any(file_name.startswith(name) for name in icon_names):
+                continue
+            if primary_icon is None or icon["size"] > primary_icon["size"]:
+                primary_icon = icon
+        return primary_icon
+
+    @staticmethod
+    def parse_provision(provision_bin):
+        start = provision_bin.find(b"<?xml")
+        end = provision_bin.find(b"</plist>")
+        if start < 0 or end < 0:
+            return None
+        try:
+            provision = biplist.readPlistFromString(
+                provision_bin[start:end + len(b"</plist>")]
+            )
+        except:
+            return None
+        expiration_date = provision.get("ExpirationDate")
+        team_ids = provision.get("TeamIdentifier") or []
+        return {
+            "name": provision.get("Name"),
+            "app_id_name": provision.get("AppIDName"),
+            "team_id": team_ids[0] if team_ids else None,
+            "team_name": provision.get("TeamName"),
+            "expiration_date": (
+                expiration_date.isoformat() if expiration_date else None
+            ),
+            "expiration_timestamp": (
+                calendar.timegm(expiration_date.utctimetuple())
+                if expiration_date else None
+            ),
+            "provisioned_devices": len(
+                provision.get("ProvisionedDevices") or []
+            ),
+            "provisions_all_devices": bool(
+                provision.get("ProvisionsAllDevices")
+            ),
+            "entitlements": provision.get("Entitlements") or {}
+        }
@@ -0,0 +1,88 @@
+import json
+import os
+import sys
+import threading
+import time
+
+
+class DeployProgressReporter:
+    LINE_WIDTH = 79
+
+    def __init__(self, events_file=None, show_line=False, format_size=None):
+        self.events_file = events_file
+        self.show_line = show_line
+        self.format_size = format_size or (lambda size: "%dB" % (size))
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def open_events(target):
+        if target.isdigit():
+            return os.fdopen(os.dup(int(target)), "w")
+        return open(target, "a")
+
+    @staticmethod
+    def format_duration(seconds):
+        if seconds is None:
+            return "--:--"
+        seconds = int(seconds)
+        if seconds >= 60 * 60:
+            return "%d:%02d:%02d" % (
+                seconds // (60 * 60), seconds // 60 % 60, seconds % 60
+            )
+        return "%d:%02d" % (seconds // 60, seconds % 60)
+
+    def create_callback(self, name, show_line=True):
+        show_line = show_line and self.show_line
+        if not self.events_file and not show_line:
+            return None
+
+        def report(event):
+            with self.lock:
+                if self.events_file:
+                    self.write_event(name, event)
+                if show_line:
+                    self.print_line(name, event)
+        return report
+
+    def write_event(self, name, event):
+        event = dict(event)
+        event["file"] = name
+        event["timestamp"] = time.time()
+        try:
+            self.events_file.write(json.dumps(event) + "\n")
+            self.events_file.flush()
+        except (IOError, OSError, ValueError):
+            self.events_file = None
+
+    def print_line(self, name, event):
+        if event["total"]:
+            percentage = "%5.1f%%" % (event["bytes"] * 100.0 / event["total"])
+            size = "%s of %s" % (
+                self.format_size(event["bytes"]),
+                self.format_size(event["total"])
+            )
+        else:
+            percentage = "  ?  %"
+            size = self.format_size(event["bytes"])
+        if event["event"] == "finish":
+            status = "%s/s average in %s" % (
+                self.format_size(event["average_throughput"]),
+                DeployProgressReporter.format_duration(event["elapsed"])
+            )
+        else:
+            status = "%s/s, %s left" % (
+                self.format_size(event["throughput"]),
+                DeployProgressReporter.format_duration(event["eta"])
+            )
+        line = "%s %s (%s) %s" % (percentage, name, size, status)
+        sys.stdout.write("\r" + line[:DeployProgressReporter.LINE_WIDTH].ljust(
+            DeployProgressReporter.LINE_WIDTH
+        ))
+        if event["event"] == "finish":
+            sys.stdout.write("\n")
+        sys.stdout.flush()
+
+    def close(self):
+        if self.events_file and self.events_file not in (sys.stdout, sys.stderr):
+            self.events_file.close()
+        self.events_file = None
@@ -0,0 +1,56 @@
+import os
+import re
+import threading
+
+MACRO_PATTERN = re.compile("<!--\\s*\\[(\\w+)]\\s*-->")
+
+try:
+    STRING_TYPES = (str, unicode)
+except NameError:
+    STRING_TYPES = (str,)
+
+
+class DeployTemplate:
+    cache = {}
+    cache_lock = threading.Lock()
+
+    def __init__(self, source):
+        parts = MACRO_PATTERN.split(source)
+        self.literals = parts[0::2]
+        self.keys = parts[1::2]
+
+    @staticmethod
+    def load(path):
+        mtime = os.path.getmtime(path)
+        with DeployTemplate.cache_lock:
+            cached = DeployTemplate.cache.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        template_file = open(path, "r")
+        template = DeployTemplate(template_file.read())
+        template_file.close()
+        with DeployTemplate.cache_lock:
+            DeployTemplate.cache[path] = (mtime, template)
+        return template
+
+    @staticmethod
+    def clear_cache():
+        with DeployTemplate.cache_lock:
+            DeployTemplate.cache.clear()
+
+    @staticmethod
+    def lookup(key, contexts):
+        for context in contexts:
+            if context and key in context:
+                value = context[key]
+                if isinstance(value, STRING_TYPES):
+                    return value
+                return str(value)
+        return ""
+
+    def render(self, *contexts):
+        output = [self.literals[0]]
+        for key, literal in zip(self.keys, self.literals[1:]):
+            output.append(DeployTemplate.lookup(key, contexts))
+            output.append(literal)
+        return "".join(output)
@@ -0,0 +1,140 @@
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import select
+import struct
+import sys
+import time
+
+
+class InotifyWatch:
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    EVENT_FORMAT = "iIII"
+    EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+    READ_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(
+            ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+        )
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        if not isinstance(path, bytes):
+            path = path.encode(sys.getfilesystemencoding() or "utf-8")
+        watch = libc.inotify_add_watch(
+            self.fd, path,
+            InotifyWatch.IN_CLOSE_WRITE |
+            InotifyWatch.IN_MOVED_TO |
+            InotifyWatch.IN_CREATE
+        )
+        if watch < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, os.strerror(error))
+
+    def read(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        data = os.read(self.fd, InotifyWatch.READ_SIZE)
+        names = []
+        position = 0
+        while position + InotifyWatch.EVENT_SIZE <= len(data):
+            _, _, _, name_length = struct.unpack_from(
+                InotifyWatch.EVENT_FORMAT, data, position
+            )
+            position += InotifyWatch.EVENT_SIZE
+            name = data[position:position + name_length].rstrip(b"\0")
+            position += name_length
+            if name:
+                names.append(name.decode(
+                    sys.getfilesystemencoding() or "utf-8", "replace"
+                ))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DeployWatcher:
+    POLL_INTERVAL = 1.0
+    SETTLE_TIME = 2.0
+
+    def __init__(self, path, pattern="*.ipa", poll_interval=None, settle_time=None, use_inotify=True):
+        self.path = path
+        self.pattern = pattern
+        self.poll_interval = poll_interval or DeployWatcher.POLL_INTERVAL
+        self.settle_time = (
+            DeployWatcher.SETTLE_TIME if settle_time is None else settle_time
+        )
+        self.inotify = None
+        if use_inotify and sys.platform.startswith("linux"):
+            try:
+                self.inotify = InotifyWatch(path)
+            except (OSError, AttributeError):
+                self.inotify = None
+        self.seen = self.snapshot()
+
+    def get_mode(self):
+        return "inotify" if self.inotify else "polling"
+
+    def stat(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime)
+
+    def snapshot(self):
+        files = {}
+        if not os.path.isdir(self.path):
+            return files
+        for name in fnmatch.filter(os.listdir(self.path), self.pattern):
+            path = os.path.join(self.path, name)
+            if os.path.isfile(path):
+                files[path] = self.stat(path)
+        return files
+
+    def poll_changes(self):
+        if self.inotify:
+            return [
+                os.path.join(self.path, name)
+                for name in set(self.inotify.read(self.poll_interval))
+                if fnmatch.fnmatch(name, self.pattern)
+            ]
+        time.sleep(self.poll_interval)
+        return list(self.snapshot())
+
+    def watch(self):
+        pending = {}
+        try:
+            while True:
+                changes = self.poll_changes()
+                now = time.time()
+                for path in changes:
+                    stat = self.stat(path)
+                    if stat and stat != self.seen.get(path) and path not in pending:
+                        pending[path] = (stat, now)
+
+                ready = []
+                for path, (stat, changed_at) in list(pending.items()):
+                    current_stat = self.stat(path)
+                    if current_stat is None:
+                        del pending[path]
+                    elif current_stat != stat:
+                        pending[path] = (current_stat, now)
+                    elif current_stat[0] and now - changed_at >= self.settle_time:
+                        ready.append(path)
+
+                if ready and len(ready) == len(pending):
+                    for path in ready:
+                        self.seen[path] = pending.pop(path)[0]
+                    yield sorted(ready)
+        finally:
+            if self.inotify:
+                self.inotify.close()
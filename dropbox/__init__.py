@@ -1,3 +1,8 @@
 from .dropbox_auth import *
 from .dropbox_client import *
 from .dropbox_util import *
+from .dropbox_upload_session import *
+from .dropbox_stream import *
+from .dropbox_retry import *
+from .dropbox_trace import *
+from .dropbox_progress import *
@@ -1,7 +1,13 @@
+import io
 import re
 import json
+import threading
+import time
 from .dropbox_connection import *
+from .dropbox_progress import *
 from .dropbox_session import *
+from .dropbox_stream import *
+from .dropbox_upload_session import *
 from .dropbox_util import *
 
 
@@ -9,8 +15,24 @@ OAUTH2_ACCESS_TOKEN_PATTERN = re.compile(r"\A[-_~/A-Za-z0-9\.\+]+=*\Z")
 
 
 class DropboxClient:
-    def __init__(self, access_token, prefix_path=None):
-        self.connection = DropboxConnection(prefix_path)
+    CHUNK_SIZE = 8 * 1024 * 1024
+    UPLOAD_SESSION_THRESHOLD = 32 * 1024 * 1024
+    CONCURRENT_CHUNK_ALIGNMENT = 4 * 1024 * 1024
+    DELETE_BATCH_SIZE = 1000
+    DELETE_BATCH_POLL_INTERVAL = 0.5
+    DELETE_BATCH_MAX_POLL_INTERVAL = 5.0
+    DELETE_BATCH_TIMEOUT = 120.0
+
+    def __init__(self, access_token, prefix_path=None, chunk_size=None, upload_session_threshold=None, concurrency=1, retry_policy=None):
+        self.connection = DropboxConnection(
+            prefix_path, retry_policy=retry_policy or DropboxRetryPolicy()
+        )
+        self.chunk_size = chunk_size or DropboxClient.CHUNK_SIZE
+        self.upload_session_threshold = (
+            upload_session_threshold or DropboxClient.UPLOAD_SESSION_THRESHOLD
+        )
+        self.concurrency = concurrency
+        self.last_upload_session = None
         if type(access_token) == str:
             if not OAUTH2_ACCESS_TOKEN_PATTERN.match(access_token):
                 raise ValueError("invalid format for oauth2_access_token: %r" % (access_token))
@@ -18,6 +40,9 @@ class DropboxClient:
         else:
             raise ValueError("'oauth2_access_token' must either be a string or a DropboxSession")
 
+    def close(self):
+        self.connection.close()
+
     def request(self, target, params=None, method="POST", content_server=False):
         if params is None:
             params = {}
@@ -34,35 +59,223 @@ class DropboxClient:
         url, params, headers = self.request("/users/get_current_account", method="POST")
         return self.connection.post(url, headers=headers)
 
-    def put_file(self, full_path, file_obj):
-        path = "/files/upload"
-        params = {
-            "path": DropboxUtil.format_path(full_path),
-            "mode": "overwrite"
-        }
-        url, params, headers = self.request(path, params, method="POST", content_server=True)
+    def content_request(self, target, arg, body=""):
+        url, params, headers = self.request(target, method="POST", content_server=True)
         headers["Content-Type"] = "application/octet-stream"
-        headers["Dropbox-API-Arg"] = json.dumps(params)
-        return self.connection.request("POST", url, body=file_obj, headers=headers)
+        headers["Dropbox-API-Arg"] = json.dumps(arg)
+        return self.connection.request("POST", url, body=body, headers=headers)
+
+    def put_file(self, full_path, file_obj, progress_callback=None):
+        if isinstance(file_obj, bytes):
+            file_obj = io.BytesIO(file_obj)
+        size = DropboxUtil.get_file_size(file_obj)
+        progress = None
+        if progress_callback:
+            progress = DropboxProgress(size, progress_callback)
+            progress.start()
+        if size is not None and size > self.upload_session_threshold:
+            if self.concurrency > 1:
+                response = self.put_file_concurrent(
+                    full_path, file_obj, size, progress=progress
+                )
+            else:
+                response = self.put_file_chunked(
+                    full_path, file_obj, size, progress=progress
+                )
+        else:
+            body = file_obj
+            if progress and hasattr(file_obj, "read"):
+                body = DropboxStreamBody(file_obj, offset=0, progress=progress)
+            response = self.content_request("/files/upload", {
+                "path": DropboxUtil.format_path(full_path),
+                "mode": "overwrite"
+            }, body)
+            if progress and not hasattr(file_obj, "read"):
+                progress.update(size or 0)
+        if progress:
+            progress.finish()
+        return response
+
+    def upload_session_start(self, chunk, session_type=None):
+        arg = {
+            "close": False
+        }
+        if session_type:
+            arg["session_type"] = session_type
+        return self.content_request("/files/upload_session/start", arg, chunk)
+
+    def upload_session_append(self, session, chunk, offset=None, close=False):
+        return self.content_request("/files/upload_session/append_v2", {
+            "cursor": session.get_cursor(offset),
+            "close": close
+        }, chunk)
+
+    def upload_session_finish(self, session, chunk=""):
+        return self.content_request("/files/upload_session/finish", {
+            "cursor": session.get_cursor(),
+            "commit": {
+                "path": DropboxUtil.format_path(session.full_path),
+                "mode": "overwrite"
+            }
+        }, chunk)
+
+    def upload_chunk(self, session, chunk):
+        started = time.time()
+        offset = session.offset
+        try:
+            if session.is_started():
+                self.upload_session_append(session, chunk)
+            else:
+                response = self.upload_session_start(chunk)
+                session.session_id = response["session_id"]
+        except ErrorResponse as e:
+            correct_offset = DropboxUploadSession.get_correct_offset(e)
+            if correct_offset is None:
+                raise
+            session.offset = correct_offset
+            return
+        attempts = self.connection.get_last_attempts()
+        session.retries += attempts - 1
+        session.commit(len(chunk))
+        session.add_chunk_timing({
+            "offset": offset,
+            "length": len(chunk),
+            "attempts": attempts,
+            "elapsed": time.time() - started
+        })
+
+    def upload_concurrent_chunk(self, session, file_obj, file_lock, offset, length, close, progress=None):
+        with file_lock:
+            file_obj.seek(offset)
+            chunk = file_obj.read(length)
+        started = time.time()
+        body = chunk
+        if progress:
+            body = DropboxStreamBody(
+                io.BytesIO(chunk), len(chunk), 0, progress=progress
+            )
+        self.upload_session_append(session, body, offset, close)
+        timing = {
+            "offset": offset,
+            "length": len(chunk),
+            "attempts": self.connection.get_last_attempts(),
+            "elapsed": time.time() - started
+        }
+        session.add_chunk_timing(timing)
+        return timing
+
+    def put_file_chunked(self, full_path, file_obj, size=None, session=None, progress=None):
+        if session is None:
+            if size is None:
+                size = DropboxUtil.get_file_size(file_obj)
+            session = DropboxUploadSession(full_path, size, self.chunk_size)
+        self.last_upload_session = session
+        if session.size is not None and hasattr(file_obj, "seek"):
+            while not session.is_complete():
+                offset = session.offset
+                chunk = DropboxStreamBody(
+                    file_obj, session.next_chunk_size(), offset,
+                    progress=progress
+                )
+                self.upload_chunk(session, chunk)
+                if progress:
+                    progress.update(session.offset - offset - len(chunk))
+            return self.upload_session_finish(session)
+        position = None if session.is_started() else 0
+        while not session.is_complete():
+            if position != session.offset:
+                if not hasattr(file_obj, "seek"):
+                    raise ValueError("cannot resume upload session on a non-seekable file")
+                file_obj.seek(session.offset)
+                position = session.offset
+            chunk = file_obj.read(session.next_chunk_size())
+            if not chunk:
+                break
+            position += len(chunk)
+            offset = session.offset
+            self.upload_chunk(session, chunk)
+            if progress:
+                progress.update(session.offset - offset)
+        return self.upload_session_finish(session)
+
+    def put_file_concurrent(self, full_path, file_obj, size=None, concurrency=None, progress=None):
+        if size is None:
+            size = DropboxUtil.get_file_size(file_obj)
+        if size is None or not hasattr(file_obj, "seek"):
+            return self.put_file_chunked(
+                full_path, file_obj, size, progress=progress
+            )
+        concurrency = min(
+            concurrency or self.concurrency,
+            DropboxConnection.POOL_SIZES[DropboxUtil.API_CONTENT_HOST]
+        )
+        alignment = DropboxClient.CONCURRENT_CHUNK_ALIGNMENT
+        chunk_size = max(self.chunk_size // alignment, 1) * alignment
+        session = DropboxUploadSession(full_path, size, chunk_size)
+        self.last_upload_session = session
+        response = self.upload_session_start("", session_type="concurrent")
+        session.session_id = response["session_id"]
+
+        file_lock = threading.Lock()
+        offsets = list(range(0, size, chunk_size)) or [0]
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(max(concurrency, 1))
+        try:
+            results = pool.imap_unordered(
+                lambda offset: self.upload_concurrent_chunk(
+                    session, file_obj, file_lock, offset,
+                    min(chunk_size, size - offset),
+                    offset == offsets[-1], progress
+                ),
+                offsets
+            )
+            for timing in results:
+                session.retries += timing["attempts"] - 1
+        finally:
+            pool.terminate()
+            pool.join()
+        session.offset = size
+        return self.upload_session_finish(session)
 
     def get_file(self, full_path):
         path = "/files/download"
         params = {
             "path": DropboxUtil.format_path(full_path)
         }
-        url, params, headers = self.request(path, params, method="GET", content_server=True)
+        url, _, headers = self.request(path, method="POST", content_server=True)
         headers["Dropbox-API-Arg"] = json.dumps(params)
-        return self.connection.request("POST", url, body=file_obj, headers=headers)
+        return self.connection.request("POST", url, body="", headers=headers, raw_response=True)
     
-    def list_folder(self, full_path):
+    def list_folder(self, full_path, recursive=False, limit=None):
         path = "/files/list_folder"
         params = {
-            "path": DropboxUtil.format_path(full_path)
+            "path": DropboxUtil.format_path(full_path),
+            "recursive": recursive
         }
+        if limit:
+            params["limit"] = limit
         url, params, headers = self.request(path, params, method="POST")
         headers["Content-Type"] = "application/json"
         return self.connection.request("POST", url, body=json.dumps(params), headers=headers)
 
+    def list_folder_continue(self, cursor):
+        path = "/files/list_folder/continue"
+        params = {
+            "cursor": cursor
+        }
+        url, params, headers = self.request(path, params, method="POST")
+        headers["Content-Type"] = "application/json"
+        return self.connection.request("POST", url, body=json.dumps(params), headers=headers)
+
+    def iter_folder(self, full_path, recursive=False, limit=None):
+        page = self.list_folder(full_path, recursive, limit)
+        while True:
+            for entry in page["entries"]:
+                yield entry
+            if not page.get("has_more"):
+                break
+            page = self.list_folder_continue(page["cursor"])
+
     def metadata(self, full_path):
         path = "/files/get_metadata"
         params = {
@@ -71,3 +284,58 @@ class DropboxClient:
         url, params, headers = self.request(path, params, method="GET")
         headers["Content-Type"] = "application/json"
         return self.connection.request("POST", url, body=json.dumps(params), headers=headers)
+
+    def copy(self, from_path, to_path):
+        path = "/files/copy_v2"
+        params = {
+            "from_path": DropboxUtil.format_path(from_path),
+            "to_path": DropboxUtil.format_path(to_path),
+            "autorename": False
+        }
+        url, params, headers = self.request(path, params, method="POST")
+        headers["Content-Type"] = "application/json"
+        return self.connection.request("POST", url, body=json.dumps(params), headers=headers)
+
+    def delete_batch(self, full_paths):
+        path = "/files/delete_batch"
+        params = {
+            "entries": [{
+                "path": DropboxUtil.format_path(full_path)
+            } for full_path in full_paths]
+        }
+        url, params, headers = self.request(path, params, method="POST")
+        headers["Content-Type"] = "application/json"
+        return self.connection.request("POST", url, body=json.dumps(params), headers=headers)
+
+    def delete_batch_check(self, async_job_id):
+        path = "/files/delete_batch/check"
+        params = {
+            "async_job_id": async_job_id
+        }
+        url, params, headers = self.request(path, params, method="POST")
+        headers["Content-Type"] = "application/json"
+        return self.connection.request("POST", url, body=json.dumps(params), headers=headers)
+
+    def wait_delete_batch(self, response, timeout=None):
+        timeout = DropboxClient.DELETE_BATCH_TIMEOUT if timeout is None else timeout
+        interval = DropboxClient.DELETE_BATCH_POLL_INTERVAL
+        started = time.time()
+        async_job_id = response.get("async_job_id")
+        while response.get(".tag") in ("async_job_id", "in_progress"):
+            if time.time() - started > timeout:
+                break
+            time.sleep(interval)
+            interval = min(interval * 2, DropboxClient.DELETE_BATCH_MAX_POLL_INTERVAL)
+            response = self.delete_batch_check(async_job_id)
+        return response
+
+    def delete_paths(self, full_paths, timeout=None):
+        results = []
+        for offset in range(0, len(full_paths), DropboxClient.DELETE_BATCH_SIZE):
+            batch = full_paths[offset:offset + DropboxClient.DELETE_BATCH_SIZE]
+            response = self.wait_delete_batch(self.delete_batch(batch), timeout)
+            entries = response.get("entries") or []
+            if response.get(".tag") != "complete":
+                entries = [response] * len(batch)
+            results.extend(zip(batch, entries))
+        return results
@@ -1,31 +1,204 @@
 import json
 import socket
+import threading
 from urllib3 import *
+from urllib3.connection import DummyConnection
+from urllib3.poolmanager import SSL_KEYWORDS
 from dropbox.dropbox_util import *
+from dropbox.dropbox_stream import *
+from dropbox.dropbox_retry import *
+from dropbox.dropbox_trace import *
+
+
+def create_traced_connection_class(connection_class, tls):
+    class DropboxTracedConnection(connection_class):
+        def connect(self):
+            with DropboxTracer.trace("connect", "http", host=self.host, tls=tls):
+                connection_class.connect(self)
+
+        def request(self, *args, **kwargs):
+            with DropboxTracer.trace("send", "http", host=self.host):
+                connection_class.request(self, *args, **kwargs)
+
+        def getresponse(self, *args, **kwargs):
+            with DropboxTracer.trace("ttfb", "http", host=self.host):
+                return connection_class.getresponse(self, *args, **kwargs)
+
+    return DropboxTracedConnection
+
+
+class DropboxHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = create_traced_connection_class(HTTPConnectionPool.ConnectionCls, False)
+
+    def _make_request(self, conn, method, url, **kwargs):
+        with DropboxTracer.trace(
+            "request", "http", method=method, host=self.host,
+            reused=getattr(conn, "sock", None) is not None
+        ):
+            return HTTPConnectionPool._make_request(
+                self, conn, method, url, **kwargs
+            )
+
+
+class DropboxHTTPSConnectionPool(HTTPSConnectionPool):
+    if HTTPSConnectionPool.ConnectionCls is not DummyConnection:
+        ConnectionCls = create_traced_connection_class(HTTPSConnectionPool.ConnectionCls, True)
+
+    def _make_request(self, conn, method, url, **kwargs):
+        with DropboxTracer.trace(
+            "request", "http", method=method, host=self.host,
+            reused=getattr(conn, "sock", None) is not None
+        ):
+            return HTTPSConnectionPool._make_request(
+                self, conn, method, url, **kwargs
+            )
+
+
+class DropboxPoolManager(PoolManager):
+    pool_classes_by_scheme = {
+        "http": DropboxHTTPConnectionPool,
+        "https": DropboxHTTPSConnectionPool
+    }
+
+    def __init__(self, pool_sizes=None, num_pools=4, **connection_pool_kw):
+        PoolManager.__init__(self, num_pools=num_pools, **connection_pool_kw)
+        self.pool_sizes = pool_sizes or {}
+        self.pool_lock = threading.Lock()
+        self.retired_connections = 0
+        self.retired_requests = 0
+        self.pools.dispose_func = self._retire_pool
+
+    def _new_pool(self, scheme, host, port):
+        kwargs = self.connection_pool_kw.copy()
+        if host in self.pool_sizes:
+            kwargs["maxsize"] = self.pool_sizes[host]
+        if scheme == "http":
+            for kw in SSL_KEYWORDS:
+                kwargs.pop(kw, None)
+        return DropboxPoolManager.pool_classes_by_scheme[scheme](
+            host, port, **kwargs
+        )
+
+    def _retire_pool(self, pool):
+        with self.pool_lock:
+            self.retired_connections += pool.num_connections
+            self.retired_requests += pool.num_requests
+        pool.close()
+
+    def get_stats(self):
+        opened = self.retired_connections
+        requests = self.retired_requests
+        hosts = {}
+        with self.pools.lock:
+            for key in list(self.pools.keys()):
+                pool = self.pools._container[key]
+                opened += pool.num_connections
+                requests += pool.num_requests
+                hosts[pool.host] = {
+                    "opened": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "reused": max(pool.num_requests - pool.num_connections, 0)
+                }
+        return {
+            "opened": opened,
+            "requests": requests,
+            "reused": max(requests - opened, 0),
+            "hosts": hosts
+        }
+
 
 class DropboxConnection:
-    def __init__(self, prefix_path=None):
+    NUM_POOLS = 4
+    POOL_SIZES = {
+        DropboxUtil.API_HOST: 4,
+        DropboxUtil.API_CONTENT_HOST: 8
+    }
+    TIMEOUT = 60.0
+
+    shared_pool_managers = {}
+    shared_lock = threading.Lock()
+
+    def __init__(self, prefix_path=None, pool_manager=None, retry_policy=None):
         self.prefix_path = prefix_path
+        self.pool_manager = pool_manager
+        self.retry_policy = retry_policy
 
-    def request(self, method, url, params=None, body=None, headers=None, raw_response=False):
+    @staticmethod
+    def create_pool_manager(prefix_path=None, pool_sizes=None):
+        pool_sizes = pool_sizes or DropboxConnection.POOL_SIZES
         try:
             import ssl
-            pool_manager = PoolManager(
-                num_pools=4,
-                maxsize=8,
+            pool_manager = DropboxPoolManager(
+                pool_sizes=pool_sizes,
+                num_pools=DropboxConnection.NUM_POOLS,
+                maxsize=max(pool_sizes.values()),
                 block=False,
-                timeout=60.0,
+                timeout=DropboxConnection.TIMEOUT,
                 cert_reqs=ssl.CERT_REQUIRED,
-                ca_certs=DropboxUtil.get_cert_file(self.prefix_path),
+                ca_certs=DropboxUtil.get_cert_file(prefix_path),
                 ssl_version=ssl.PROTOCOL_TLSv1,
             )
         except (ImportError):
-            pool_manager = PoolManager(
-                num_pools=4,
-                maxsize=8,
+            pool_manager = DropboxPoolManager(
+                pool_sizes=pool_sizes,
+                num_pools=DropboxConnection.NUM_POOLS,
+                maxsize=max(pool_sizes.values()),
                 block=False,
-                timeout=60.0,
+                timeout=DropboxConnection.TIMEOUT,
+            )
+        return pool_manager
+
+    @staticmethod
+    def get_shared_pool_manager(prefix_path=None):
+        with DropboxConnection.shared_lock:
+            pool_manager = DropboxConnection.shared_pool_managers.get(
+                prefix_path
+            )
+            if pool_manager is None:
+                pool_manager = DropboxConnection.create_pool_manager(
+                    prefix_path
+                )
+                DropboxConnection.shared_pool_managers[prefix_path] = (
+                    pool_manager
+                )
+            return pool_manager
+
+    @staticmethod
+    def close_shared():
+        with DropboxConnection.shared_lock:
+            pool_managers = list(
+                DropboxConnection.shared_pool_managers.values()
+            )
+            DropboxConnection.shared_pool_managers.clear()
+        for pool_manager in pool_managers:
+            pool_manager.clear()
+
+    def get_pool_manager(self):
+        if self.pool_manager is None:
+            self.pool_manager = DropboxConnection.get_shared_pool_manager(
+                self.prefix_path
             )
+        return self.pool_manager
+
+    def get_stats(self):
+        if self.pool_manager is None:
+            return {"opened": 0, "requests": 0, "reused": 0, "hosts": {}}
+        return self.pool_manager.get_stats()
+
+    def close(self):
+        if self.pool_manager is None:
+            return
+        with DropboxConnection.shared_lock:
+            for key, pool_manager in list(
+                DropboxConnection.shared_pool_managers.items()
+            ):
+                if pool_manager is self.pool_manager:
+                    del DropboxConnection.shared_pool_managers[key]
+        self.pool_manager.clear()
+        self.pool_manager = None
+
+    def request(self, method, url, params=None, body=None, headers=None, raw_response=False):
+        pool_manager = self.get_pool_manager()
 
         params = params or {}
         headers = headers or {}
@@ -37,16 +210,29 @@ class DropboxConnection:
             body = urllib.urlencode(params)
             headers["Content-type"] = "application/x-www-form-urlencoded"
 
-        if hasattr(body, "getvalue"):
-            body = str(body.getvalue())
+        if hasattr(body, "read"):
+            body = DropboxStreamBody.wrap(body)
             headers["Content-Length"] = len(body)
 
         for key, value in headers.items():
             if type(value) == str and "\n" in value:
                 raise ValueError("headers should not contain newlines (" + key + ": " + value + ")")
 
+        with DropboxTracer.trace(
+            DropboxRetryPolicy.get_target(url), "api", method=method
+        ):
+            if self.retry_policy is None:
+                return self.send(pool_manager, method, url, body, headers, raw_response)
+            return self.retry_policy.execute(url, lambda: self.send(
+                pool_manager, method, url, body, headers, raw_response
+            ))
+
+    def send(self, pool_manager, method, url, body, headers, raw_response):
+        if isinstance(body, DropboxStreamBody):
+            body.rewind()
+
         try:
-            response = pool_manager.urlopen(method=method, url=url, body=body, headers=headers, preload_content=False)
+            response = pool_manager.urlopen(method=method, url=url, body=body, headers=headers, retries=0, preload_content=False)
         except socket.error as e:
             raise SocketError(url, e)
         except exceptions.SSLError as e:
@@ -57,11 +243,22 @@ class DropboxConnection:
 
         return self.process_response(response, raw_response)
 
+    def get_last_attempts(self):
+        if self.retry_policy is None:
+            return 1
+        return self.retry_policy.get_last_attempts()
+
+    def get_retry_stats(self):
+        if self.retry_policy is None:
+            return {"retries": 0, "backoff_time": 0.0}
+        return self.retry_policy.get_stats()
+
     def process_response(self, r, raw_response):
         if raw_response:
             return r
         else:
-            resp = json.loads(r.read().decode("utf-8"))
+            with DropboxTracer.trace("body", "http"):
+                resp = json.loads(r.read().decode("utf-8"))
             r.close()
 
         return resp
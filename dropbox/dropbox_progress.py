@@ -0,0 +1,66 @@
+import threading
+import time
+
+
+class DropboxProgress:
+    INTERVAL = 0.5
+
+    def __init__(self, total, callback=None, interval=None):
+        self.total = total
+        self.callback = callback
+        self.interval = DropboxProgress.INTERVAL if interval is None else interval
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.started = time.time()
+        self.last_time = self.started
+        self.last_bytes = 0
+        self.throughput = 0.0
+
+    def create_event(self, event, now):
+        elapsed = now - self.started
+        interval = now - self.last_time
+        if interval > 0:
+            self.throughput = max(self.bytes - self.last_bytes, 0) / interval
+        self.last_time = now
+        self.last_bytes = self.bytes
+        average_throughput = self.bytes / elapsed if elapsed > 0 else 0.0
+        remaining = None
+        eta = None
+        if self.total is not None:
+            remaining = max(self.total - self.bytes, 0)
+            if average_throughput > 0:
+                eta = remaining / average_throughput
+        return {
+            "event": event,
+            "bytes": self.bytes,
+            "total": self.total,
+            "elapsed": elapsed,
+            "throughput": self.throughput,
+            "average_throughput": average_throughput,
+            "eta": eta
+        }
+
+    def report(self, event):
+        if self.callback:
+            self.callback(event)
+
+    def start(self):
+        with self.lock:
+            self.started = time.time()
+            self.last_time = self.started
+            event = self.create_event("start", self.started)
+        self.report(event)
+
+    def update(self, count):
+        with self.lock:
+            self.bytes += count
+            now = time.time()
+            if count <= 0 or now - self.last_time < self.interval:
+                return
+            event = self.create_event("progress", now)
+        self.report(event)
+
+    def finish(self):
+        with self.lock:
+            event = self.create_event("finish", time.time())
+        self.report(event)
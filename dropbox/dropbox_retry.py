@@ -0,0 +1,120 @@
+import random
+import socket
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+from urllib3 import exceptions
+from urllib3.util import parse_url
+from .dropbox_util import *
+
+
+class DropboxRetryPolicy:
+    RETRY_STATUSES = (429, 503)
+    IDEMPOTENT_RETRY_STATUSES = (500, 502, 504)
+    IDEMPOTENT_TARGETS = (
+        "/users/get_current_account",
+        "/files/get_metadata",
+        "/files/list_folder",
+        "/files/list_folder/continue",
+        "/files/download",
+        "/files/delete_batch/check",
+        "/files/upload",
+        "/files/upload_session/append_v2",
+        "/files/upload_session/finish"
+    )
+
+    def __init__(self, max_retries=5, backoff_factor=0.5, max_backoff=30.0, max_elapsed=120.0, jitter=True):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_elapsed = max_elapsed
+        self.jitter = jitter
+        self.stats_lock = threading.Lock()
+        self.local = threading.local()
+        self.retries = 0
+        self.backoff_time = 0.0
+
+    @staticmethod
+    def get_target(url):
+        path = parse_url(url).path or ""
+        prefix = "/%d" % (DropboxUtil.API_VERSION)
+        if path.startswith(prefix + "/"):
+            path = path[len(prefix):]
+        return path
+
+    def is_idempotent(self, url):
+        return DropboxRetryPolicy.get_target(url) in DropboxRetryPolicy.IDEMPOTENT_TARGETS
+
+    def is_retryable(self, error, url):
+        status = getattr(error, "status", None)
+        if status is not None:
+            if status in DropboxRetryPolicy.RETRY_STATUSES:
+                return True
+            return (
+                status in DropboxRetryPolicy.IDEMPOTENT_RETRY_STATUSES and
+                self.is_idempotent(url)
+            )
+        if isinstance(error, (socket.error, exceptions.HTTPError)):
+            return self.is_idempotent(url)
+        return False
+
+    @staticmethod
+    def get_retry_after(error):
+        body = getattr(error, "body", None)
+        if isinstance(body, dict):
+            error_info = body.get("error")
+            if isinstance(error_info, dict) and "retry_after" in error_info:
+                return float(error_info["retry_after"])
+        headers = getattr(error, "headers", None) or {}
+        retry_after = None
+        for key in headers:
+            if key.lower() == "retry-after":
+                retry_after = headers[key]
+        if retry_after is None:
+            return None
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass
+        retry_date = parsedate_tz(retry_after)
+        if retry_date is None:
+            return None
+        return max(mktime_tz(retry_date) - time.time(), 0.0)
+
+    def get_backoff(self, attempt, error=None):
+        retry_after = DropboxRetryPolicy.get_retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        backoff = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+        return backoff
+
+    def get_last_attempts(self):
+        return getattr(self.local, "attempts", 1)
+
+    def get_stats(self):
+        with self.stats_lock:
+            return {
+                "retries": self.retries,
+                "backoff_time": self.backoff_time
+            }
+
+    def execute(self, url, function):
+        started = time.time()
+        attempt = 0
+        while True:
+            self.local.attempts = attempt + 1
+            try:
+                return function()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e, url):
+                    raise
+                backoff = self.get_backoff(attempt, e)
+                if time.time() - started + backoff > self.max_elapsed:
+                    raise
+            with self.stats_lock:
+                self.retries += 1
+                self.backoff_time += backoff
+            time.sleep(backoff)
+            attempt += 1
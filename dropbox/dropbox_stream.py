@@ -0,0 +1,50 @@
+import os
+from .dropbox_util import *
+
+
+class DropboxStreamBody:
+    BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, file_obj, length=None, offset=None, block_size=None, progress=None):
+        self.file_obj = file_obj
+        if offset is None:
+            offset = file_obj.tell() if hasattr(file_obj, "tell") else 0
+        if length is None:
+            length = DropboxUtil.get_file_size(file_obj) - offset
+        self.offset = offset
+        self.length = length
+        self.block_size = block_size or DropboxStreamBody.BLOCK_SIZE
+        self.progress = progress
+        self.sent = 0
+        self.rewind()
+
+    @staticmethod
+    def wrap(body):
+        if isinstance(body, DropboxStreamBody):
+            return body
+        return DropboxStreamBody(body, offset=0)
+
+    def __len__(self):
+        return int(self.length)
+
+    def rewind(self):
+        if hasattr(self.file_obj, "seek"):
+            self.file_obj.seek(self.offset, os.SEEK_SET)
+        self.remaining = self.length
+        if self.progress and self.sent:
+            self.progress.update(-self.sent)
+        self.sent = 0
+
+    def read(self, amt=None):
+        if self.remaining <= 0:
+            return b""
+        if amt is None or amt < 0 or amt > self.block_size:
+            amt = self.block_size
+        data = self.file_obj.read(min(amt, self.remaining))
+        self.remaining -= len(data)
+        if not data:
+            self.remaining = 0
+        elif self.progress:
+            self.sent += len(data)
+            self.progress.update(len(data))
+        return data
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+
+
+class DropboxTraceSpan:
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, error_type, error, error_traceback):
+        if error_type is not None:
+            self.args["error"] = error_type.__name__
+        self.tracer.add(
+            self.name, self.category, self.started, time.time(), self.args
+        )
+        return False
+
+
+class DropboxNullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, error_traceback):
+        return False
+
+
+class DropboxTracer:
+    active = None
+    null_span = DropboxNullSpan()
+
+    def __init__(self, name="run", path=None):
+        self.name = name
+        self.path = path
+        self.started = time.time()
+        self.thread = threading.current_thread()
+        self.lock = threading.Lock()
+        self.spans = []
+
+    @staticmethod
+    def start(name="run", path=None):
+        DropboxTracer.active = DropboxTracer(name, path)
+        return DropboxTracer.active
+
+    @staticmethod
+    def stop():
+        tracer = DropboxTracer.active
+        DropboxTracer.active = None
+        if tracer is not None:
+            tracer.spans.insert(0, tracer.create_span(
+                tracer.name, "run", tracer.started, time.time(), {},
+                tracer.thread
+            ))
+        return tracer
+
+    @staticmethod
+    def trace(name, category="deploy", **args):
+        tracer = DropboxTracer.active
+        if tracer is None:
+            return DropboxTracer.null_span
+        return DropboxTraceSpan(tracer, name, category, args)
+
+    def create_span(self, name, category, started, finished, args, thread=None):
+        thread = thread or threading.current_thread()
+        return {
+            "name": name,
+            "category": category,
+            "start": (started - self.started) * 1000,
+            "duration": (finished - started) * 1000,
+            "thread": thread.name,
+            "thread_id": thread.ident,
+            "args": args
+        }
+
+    def add(self, name, category, started, finished, args):
+        span = self.create_span(name, category, started, finished, args)
+        with self.lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self.lock:
+            self.spans = []
+
+    def get_spans(self):
+        with self.lock:
+            return sorted(self.spans, key=lambda span: span["start"])
+
+    def get_summary(self):
+        summary = {}
+        for span in self.get_spans():
+            key = "%s:%s" % (span["category"], span["name"])
+            if key not in summary:
+                summary[key] = {"count": 0, "duration": 0.0}
+            summary[key]["count"] += 1
+            summary[key]["duration"] += span["duration"]
+        return summary
+
+    def get_result(self):
+        return {
+            "spans": self.get_spans(),
+            "summary": self.get_summary()
+        }
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for span in self.get_spans():
+            threads[span["thread_id"]] = span["thread"]
+            events.append({
+                "name": span["name"],
+                "cat": span["category"],
+                "ph": "X",
+                "ts": int(span["start"] * 1000),
+                "dur": int(span["duration"] * 1000),
+                "pid": pid,
+                "tid": span["thread_id"],
+                "args": span["args"]
+            })
+        for thread_id, thread_name in threads.items():
+            events.append({
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": thread_id,
+                "args": {"name": thread_name}
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save_chrome_trace(self, path):
+        trace_file = open(path, "w")
+        try:
+            json.dump(self.to_chrome_trace(), trace_file)
+        finally:
+            trace_file.close()
@@ -0,0 +1,58 @@
+class DropboxUploadSession:
+    def __init__(self, full_path, size, chunk_size, session_id=None, offset=0):
+        self.full_path = full_path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.session_id = session_id
+        self.offset = offset
+        self.retries = 0
+        self.chunk_timings = []
+
+    def is_started(self):
+        return self.session_id is not None
+
+    def is_complete(self):
+        return self.size is not None and self.offset >= self.size
+
+    def next_chunk_size(self):
+        if self.size is None:
+            return self.chunk_size
+        return max(min(self.chunk_size, self.size - self.offset), 0)
+
+    def commit(self, length):
+        self.offset += length
+
+    def add_chunk_timing(self, timing):
+        self.chunk_timings.append(timing)
+
+    def get_cursor(self, offset=None):
+        return {
+            "session_id": self.session_id,
+            "offset": self.offset if offset is None else offset
+        }
+
+    def get_progress(self):
+        return {
+            "session_id": self.session_id,
+            "offset": self.offset,
+            "size": self.size,
+            "retries": self.retries,
+            "chunks": sorted(
+                self.chunk_timings, key=lambda timing: timing["offset"]
+            )
+        }
+
+    @staticmethod
+    def get_correct_offset(error):
+        body = getattr(error, "body", None)
+        if not isinstance(body, dict):
+            return None
+        error_info = body.get("error")
+        if isinstance(error_info, dict) and "lookup_failed" in error_info:
+            error_info = error_info["lookup_failed"]
+        if (
+            isinstance(error_info, dict) and
+            error_info.get(".tag") == "incorrect_offset"
+        ):
+            return error_info.get("correct_offset")
+        return None
@@ -1,13 +1,16 @@
 import re
 import os
 import urllib
+import hashlib
 
 
 class DropboxUtil:
     API_VERSION = 2
+    API_SCHEME = "https"
     WEB_HOST = "www.dropbox.com"
     API_HOST = "api.dropbox.com"
     API_CONTENT_HOST = "api-content.dropbox.com"
+    CONTENT_HASH_BLOCK_SIZE = 4 * 1024 * 1024
 
     @staticmethod
     def get_cert_file(prefix=None):
@@ -33,7 +36,7 @@ class DropboxUtil:
 
     @staticmethod
     def build_url(host, target, prefix=True, params=None):
-        return "https://" + host + DropboxUtil.build_path(target, prefix, params)
+        return DropboxUtil.API_SCHEME + "://" + host + DropboxUtil.build_path(target, prefix, params)
 
     @staticmethod
     def split_path(path):
@@ -58,3 +61,40 @@ class DropboxUtil:
         else:
             split_paths = DropboxUtil.split_path(path)
             return "/" + "/".join(split_paths)
+
+    @staticmethod
+    def get_file_size(file_obj):
+        if hasattr(file_obj, "fileno"):
+            try:
+                return os.fstat(file_obj.fileno()).st_size
+            except (AttributeError, IOError, OSError, ValueError):
+                pass
+        if hasattr(file_obj, "seek") and hasattr(file_obj, "tell"):
+            position = file_obj.tell()
+            file_obj.seek(0, os.SEEK_END)
+            size = file_obj.tell()
+            file_obj.seek(position)
+            return size
+        if isinstance(file_obj, (bytes, str)):
+            return len(file_obj)
+        return None
+
+    @staticmethod
+    def get_content_hash(file_obj, read_size=64 * 1024):
+        block_size = DropboxUtil.CONTENT_HASH_BLOCK_SIZE
+        overall_hash = hashlib.sha256()
+        block_hash = hashlib.sha256()
+        block_position = 0
+        while True:
+            data = file_obj.read(min(read_size, block_size - block_position))
+            if not data:
+                break
+            block_hash.update(data)
+            block_position += len(data)
+            if block_position == block_size:
+                overall_hash.update(block_hash.digest())
+                block_hash = hashlib.sha256()
+                block_position = 0
+        if block_position > 0:
+            overall_hash.update(block_hash.digest())
+        return overall_hash.hexdigest()